@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+
+# times the parse phases on a synthetic dump (ingest, context run through, ready_files, write_files),
+# with the peak memory of each, and checks the output tree against the stored golden run
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import tracemalloc
+
+bench_dir = os.path.dirname (os.path.abspath (__file__))
+sys.path.insert (0, os.path.dirname (bench_dir))
+sys.path.insert (0, bench_dir)
+
+import dumparse
+import gen_dump
+
+golden_path = os.path.join (bench_dir, 'golden.json')
+
+# the generator settings a golden run is tied to
+def dump_config (args):
+    return {action.dest: getattr (args, action.dest) for action in gen_dump.make_parser ()._actions if action.dest != 'help'}
+
+class PhaseTimer:
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.phases = []
+
+    def run (self, name, function, *args):
+        if self.memory:
+            tracemalloc.reset_peak ()
+            start_memory = tracemalloc.get_traced_memory ()[0]
+        wall, cpu = time.perf_counter (), time.process_time ()
+        result = function (*args)
+        phase = {'phase': name, 'wall': time.perf_counter () - wall, 'cpu': time.process_time () - cpu}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory ()
+            phase['peak-memory'] = peak
+            phase['memory-growth'] = current - start_memory
+        self.phases.append (phase)
+        return result
+
+def ingest (blocks, path, use_mmap):
+    return blocks.read (path, use_mmap)
+
+def run_parse (path, args, timer):
+    blocks = dumparse.DumpBlocks ()
+    blocks.writer = dumparse.DumpWriter (args.workers)
+    if args.stream:
+        # phases overlap when streaming, so it is all one
+        def stream ():
+            blocks.parse (path, args.mmap, True)
+        timer.run ('stream', stream)
+        return blocks
+    timer.run ('ingest', ingest, blocks, path, args.mmap)
+    timer.run ('context_run_through', blocks.context_run_through)
+    timer.run ('ready_files', blocks.ready_files)
+    timer.run ('write_files', blocks.write_files)
+    if blocks.source is not None:  blocks.source.close ()
+    return blocks
+
+# relative path -> sha256 of everything under out_dir
+def tree_hashes (out_dir):
+    hashes = {}
+    for dirpath, dirnames, filenames in os.walk (out_dir):
+        for filename in filenames:
+            path = os.path.join (dirpath, filename)
+            with open (path, 'rb') as f:
+                hashes[os.path.relpath (path, out_dir)] = hashlib.sha256 (f.read ()).hexdigest ()
+    return hashes
+
+def check_golden (hashes, config, update):
+    if update:
+        with open (golden_path, 'w') as f:
+            json.dump ({'config': config, 'files': hashes}, f, indent=1, sort_keys=True)
+        return 'golden updated'
+    if not os.path.exists (golden_path):
+        return 'no golden run, make one with -update-golden'
+    with open (golden_path) as f:
+        golden = json.load (f)
+    if golden['config'] != config:
+        return 'not checked, golden run was made with other generator settings'
+    missing = sorted (set (golden['files']) - set (hashes))
+    extra = sorted (set (hashes) - set (golden['files']))
+    changed = sorted (path for path in hashes if path in golden['files'] and golden['files'][path] != hashes[path])
+    if not missing and not extra and not changed:
+        return f'matches golden run ({len (hashes)} files)'
+    for label, paths in (('missing', missing), ('extra', extra), ('changed', changed)):
+        for path in paths[:20]:
+            print (f'{label}: {path}', file=sys.stderr)
+    return f'DIFFERS from golden run: {len (missing)} missing, {len (extra)} extra, {len (changed)} changed'
+
+def main ():
+    parser = argparse.ArgumentParser (description='Benchmark the dump parser on a synthetic dump.', parents=[gen_dump.make_parser (add_help=False)])
+    parser.add_argument ('-dump', dest='dump', default=None, help='existing dump to parse instead of generating one (no golden check)')
+    parser.add_argument ('-stream', dest='stream', action='store_true', help='parse with -stream')
+    parser.add_argument ('-mmap', dest='mmap', action='store_true', help='parse with -mmap')
+    parser.add_argument ('-workers', dest='workers', type=int, default=1, help='writer threads')
+    parser.add_argument ('-no-memory', dest='memory', action='store_false', help='skip tracemalloc, which slows the parse')
+    parser.add_argument ('-update-golden', dest='update_golden', action='store_true', help='store this run\'s output tree as the golden run')
+    parser.add_argument ('-json', dest='json', default=None, help='also write the results as JSON to this file')
+    args = parser.parse_args ()
+
+    with tempfile.TemporaryDirectory (prefix='dumparse-bench-') as work_dir:
+        path = args.dump
+        if path is None:
+            path = os.path.join (work_dir, 'dump.txt')
+            gen_dump.generate (args, path)
+        path = os.path.abspath (path)
+        size = os.path.getsize (path)
+
+        timer = PhaseTimer (args.memory)
+        cwd = os.getcwd ()
+        os.chdir (work_dir)
+        try:
+            if args.memory:  tracemalloc.start ()
+            blocks = run_parse (path, args, timer)
+            if args.memory:  tracemalloc.stop ()
+        finally:
+            os.chdir (cwd)
+
+        hashes = tree_hashes (os.path.join (work_dir, 'Support-Dump'))
+        golden = check_golden (hashes, dump_config (args), args.update_golden) if args.dump is None else 'not checked, own dump'
+
+    total = sum (phase['wall'] for phase in timer.phases)
+    print (f'dump {size / 1e6:.1f} MB, {len (hashes)} files written, {size / 1e6 / total:.1f} MB/s')
+    for phase in timer.phases:
+        memory = f'  peak {phase["peak-memory"] / 1e6:8.1f} MB' if 'peak-memory' in phase else ''
+        print (f'{phase["phase"]:>22}  wall {phase["wall"]:8.3f} s  cpu {phase["cpu"]:8.3f} s{memory}')
+    print (f'golden check:  {golden}')
+    if args.json:
+        with open (args.json, 'w') as f:
+            json.dump ({'dump-bytes': size, 'files': len (hashes), 'phases': timer.phases, 'golden': golden}, f, indent=1)
+    if golden.startswith ('DIFFERS'):  sys.exit (1)
+
+
+if __name__ == '__main__':
+    main ()
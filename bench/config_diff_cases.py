@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+
+# runs -config-diff on pairs of small hand made configuration files and checks what it reports:
+# a changed member of a single container is followed down into it, reordering isn't a change,
+# repeated siblings are told apart by name or id
+
+import os
+import io
+import sys
+import tempfile
+import contextlib
+
+bench_dir = os.path.dirname (os.path.abspath (__file__))
+sys.path.insert (0, os.path.dirname (bench_dir))
+
+import dumparse
+
+# (name, old databases.xml, new databases.xml, the change lines -config-diff should print)
+cases = [
+    ('changed member of a single container',
+     '<databases><database><database-name>Documents</database-name>'
+     '<forests><forest-id>1</forest-id></forests></database></databases>',
+     '<databases><database><database-name>Documents</database-name>'
+     '<forests><forest-id>2</forest-id></forests></database></databases>',
+     ['  changed  databases/database/forests/forest-id:  1 -> 2']),
+    ('changed member of a repeated sibling',
+     '<databases><database><database-name>Documents</database-name><in-memory-limit>32768</in-memory-limit></database>'
+     '<database><database-name>Security</database-name><in-memory-limit>32768</in-memory-limit></database></databases>',
+     '<databases><database><database-name>Documents</database-name><in-memory-limit>65536</in-memory-limit></database>'
+     '<database><database-name>Security</database-name><in-memory-limit>32768</in-memory-limit></database></databases>',
+     ['  changed  databases/database[Documents]/in-memory-limit:  32768 -> 65536']),
+    ('sibling added to a single one',
+     '<databases><database><database-name>Documents</database-name></database></databases>',
+     '<databases><database><database-name>Documents</database-name></database>'
+     '<database><database-name>Triggers</database-name></database></databases>',
+     ['  added    databases/database[Triggers]']),
+    ('reordered',
+     '<databases><database><database-name>A</database-name></database><database><database-name>B</database-name></database></databases>',
+     '<databases><database><database-name>B</database-name></database><database><database-name>A</database-name></database></databases>',
+     []),
+]
+
+def run_case (work_dir, old, new):
+    trees = []
+    for name, text in (('old', old), ('new', new)):
+        directory = os.path.join (work_dir, name, 'Group-0', 'host-1', 'Configuration')
+        os.makedirs (directory)
+        with open (os.path.join (directory, 'databases.xml'), 'w') as f:
+            f.write (text)
+        trees.append (os.path.join (work_dir, name))
+    output = io.StringIO ()
+    with contextlib.redirect_stdout (output):
+        dumparse.config_diff (trees)
+    return [line for line in output.getvalue ().splitlines () if line.startswith ('  ')]
+
+def main ():
+    failed = 0
+    for name, old, new, expected in cases:
+        with tempfile.TemporaryDirectory (prefix='dumparse-config-diff-') as work_dir:
+            found = run_case (work_dir, old, new)
+        if found != expected:
+            failed += 1
+            print (f'FAILED  {name}:  expected {expected}, got {found}')
+        else:
+            print (f'ok      {name}')
+    if failed:  sys.exit (1)
+
+
+if __name__ == '__main__':
+    main ()
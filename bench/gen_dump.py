@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+
+# builds a synthetic support dump with the separators find_separators recognizes:
+# cluster part (dump info, app servers, topology, forest status, CPF/SQL/trigger/schema sections)
+# then a host section per host (host status, configuration files, log files, data directory)
+
+import sys
+import random
+import argparse
+
+subsep = '=' * 75
+sep = '#' * 75
+bigsep = '%' * 75
+
+config_files = ['server.xml', 'groups.xml', 'databases.xml', 'assignments.xml', 'hosts.xml', 'clusters.xml', 'keystore.xml', 'kms.xml', 'tokenizer.xml', 'mimetypes.xml']
+log_files = ['ErrorLog.txt', '8000_AccessLog.txt', '8000_ErrorLog.txt', '8001_RequestLog.txt', 'TaskServer_ErrorLog.txt']
+log_levels = ['Finest', 'Fine', 'Debug', 'Info', 'Notice', 'Warning', 'Error']
+
+class DumpGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random (args.seed)
+        self.out = None
+        self.hosts = [f'host-{i}.example.com' for i in range (1, args.hosts + 1)]
+        self.host_ids = {host: str (10000000000000000000 + i) for i, host in enumerate (self.hosts)}
+        self.groups = {host: f'Group-{i % args.groups}' for i, host in enumerate (self.hosts)}
+        self.databases = ['Documents', 'Security', 'Schemas', 'Triggers', 'Meters'] + [f'db-{i}' for i in range (args.databases)]
+        self.next_id = 1000
+
+    def new_id (self):
+        self.next_id += 1
+        return str (self.random.randrange (10**17, 10**18) * 10 + self.next_id % 10)
+
+    def line (self, text=''):
+        self.out.write (text + '\n')
+
+    def lines (self, texts):
+        for text in texts:
+            self.line (text)
+
+    def heading (self, title, separator=subsep):
+        self.lines ([separator, title, separator])
+
+    def xml (self, name, children, indent='  ', attributes=''):
+        yield f'<{name}{attributes}>'
+        for child, value in children:
+            if isinstance (value, list):
+                for line in self.xml (child, value, indent):
+                    yield indent + line
+            else:
+                yield f'{indent}<{child}>{value}</{child}>'
+        yield f'</{name}>'
+
+    def dump_info (self):
+        self.line (bigsep)
+        self.lines ([f'Report Host: {self.hosts[0]}', 'Report Time: 2026-10-18T12:00:00', 'MarkLogic Version: 11.0.3', '', 'Support Request: synthetic'])
+        self.line (bigsep)
+
+    def app_servers (self):
+        self.heading ('App Server Status')
+        for host in self.hosts:
+            for i in range (self.args.appservers):
+                self.line (subsep)
+                self.line (f'Group: {self.groups[host]}, Appserver: AppServer-{i}, Host: {host}')
+                children = [('server-id', self.new_id ()), ('server-name', f'AppServer-{i}'), ('host-id', self.host_ids[host]),
+                            ('threads', self.random.randrange (0, 32)), ('max-threads', 32), ('queue-size', self.random.randrange (0, 5)),
+                            ('request-statuses', [('request-status', [('request-id', self.new_id ()), ('elapsed-time', 'PT0.01S')])])]
+                self.lines (self.xml ('server-status', children, attributes=' xmlns="http://marklogic.com/xdmp/status/server"'))
+
+    def database_topology (self):
+        self.heading ('Database Topology')
+        for database in self.databases:
+            self.lines ([f'Database: {database}', f'  Forests: {database}-1, {database}-2'])
+            self.line (subsep)
+        self.lines (['Summary:', f'  {len (self.databases)} databases'])
+
+    def forest_status (self):
+        self.heading ('Forest Status')
+        self.forest_ids = {}
+        first = True
+        for host in self.hosts:
+            for i in range (self.args.forests):
+                if not first:  self.line (subsep)
+                first = False
+                name = f'forest-{host.split (".")[0]}-{i}'
+                forest_id = self.new_id ()
+                self.line (name)
+                children = [('forest-id', forest_id), ('forest-name', name), ('host-id', self.host_ids[host]), ('state', 'open'),
+                            ('current-master-forest', forest_id),
+                            ('transaction-participants', [('transaction-participant', [('transaction-id', self.new_id ()), ('coordinator-id', forest_id), ('min-commit-timestamp', '16000000000000000')])])]
+                self.lines (self.xml ('forest-status', children, attributes=' xmlns="http://marklogic.com/xdmp/status/forest"'))
+                self.lines (self.xml ('forest-counts', [('forest-name', name), ('stands-counts', [('document-count', self.random.randrange (1000))])]))
+
+    def database_section (self, title, make):
+        self.heading (title)
+        first = True
+        for database in self.databases[:4]:
+            if not first:  self.line (subsep)
+            first = False
+            self.line (database)
+            if database == 'Schemas':  continue
+            for i in range (self.args.definitions):
+                self.lines (make (i))
+
+    def trigger (self, i):
+        return self.xml ('trgr:trigger', [('trgr:trigger-id', self.new_id ()), ('trgr:trigger-name', f'trigger-{i}')], attributes=' xmlns:trgr="http://marklogic.com/xdmp/triggers"')
+
+    def cpf_domain (self, i):
+        return list (self.xml ('dom:domain', [('dom:domain-id', self.new_id ()), ('dom:domain-name', f'domain-{i}')])) + list (self.xml ('dom:configuration', [('dom:config-id', self.new_id ())]))
+
+    def cpf_pipeline (self, i):
+        return self.xml ('p:pipeline', [('p:pipeline-id', self.new_id ()), ('p:pipeline-name', f'pipeline-{i}')])
+
+    def flexrep_domain (self, i):
+        return list (self.xml ('domain-status', [('domain-name', f'domain-{i}')])) + list (self.xml ('flexrep:configuration', [('flexrep:domain-id', self.new_id ())]))
+
+    def sql_schema (self, i):
+        return self.xml ('view:schema', [('view:schema-id', self.new_id ()), ('view:schema-name', f'schema-{i}')])
+
+    def sql_view (self, i):
+        return self.xml ('view:view', [('view:view-id', self.new_id ()), ('view:view-name', f'view-{i}')])
+
+    def xml_schema (self, i):
+        return self.xml ('xs:schema', [('xs:element', f'element-{i}')], attributes=' xmlns:xs="http://www.w3.org/2001/XMLSchema"')
+
+    def host_section (self, host):
+        self.lines ([bigsep, f'Hostname: {host}', bigsep])
+        self.lines (['Host Info:', f'  Host: {host}', '  Uptime: 12 days'])
+        self.heading ('Host Status')
+        self.lines (self.xml ('host-status', [('host-id', self.host_ids[host]), ('host-name', host), ('group-id', self.new_id ())], attributes=' xmlns="http://marklogic.com/xdmp/status/host"'))
+        self.heading ('Configuration')
+        for i, filename in enumerate (config_files[:self.args.config_files]):
+            self.line (subsep)
+            if i == 7:
+                self.line (f'Configuration file /var/opt/MarkLogic/{filename} not found.')
+                continue
+            self.lines ([filename, subsep, 'Validation results: valid', subsep])
+            name = filename[:-4]
+            self.lines (self.xml (name, [(f'{name}-setting-{j}', j) for j in range (20)], attributes=f' xmlns="http://marklogic.com/xdmp/{name}"'))
+        self.heading ('Log Files')
+        for filename in log_files[:self.args.log_files]:
+            self.lines ([f'/var/opt/MarkLogic/Logs/{filename}', subsep])
+            for i in range (self.args.log_lines):
+                level = self.random.choice (log_levels)
+                # spread over 8 hours from 10:00, in order like a real log
+                seconds = i * 8 * 3600 // max (self.args.log_lines, 1)
+                self.line (f'2026-10-18 {10 + seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{i % 1000:03d} {level}: synthetic message {i} on {host}' + ('  ' if i % 50 == 7 else ''))
+                if i % 97 == 5:
+                    self.lines (['  continuation of stack trace', ''])
+            self.line (subsep)
+        self.lines (['Data Directory', subsep, '/var/opt/MarkLogic  2 GB free'])
+
+    def generate (self, out):
+        self.out = out
+        self.dump_info ()
+        self.app_servers ()
+        self.database_topology ()
+        self.forest_status ()
+        for title, make in (('Trigger Definitions', self.trigger), ('CPF Domains', self.cpf_domain), ('CPF Pipelines', self.cpf_pipeline),
+                            ('FlexRep Domains', self.flexrep_domain), ('SQL Schemas', self.sql_schema), ('SQL Views', self.sql_view),
+                            ('XML Schemas', self.xml_schema)):
+            if self.args.definitions > 0:
+                self.database_section (title, make)
+        for host in self.hosts:
+            self.host_section (host)
+
+
+def make_parser (add_help=True):
+    parser = argparse.ArgumentParser (description='Generate a synthetic support dump.', add_help=add_help)
+    parser.add_argument ('-hosts', dest='hosts', type=int, default=3, help='number of hosts')
+    parser.add_argument ('-groups', dest='groups', type=int, default=2, help='number of groups')
+    parser.add_argument ('-databases', dest='databases', type=int, default=2, help='number of databases besides the system ones')
+    parser.add_argument ('-forests', dest='forests', type=int, default=2, help='forests per host')
+    parser.add_argument ('-appservers', dest='appservers', type=int, default=2, help='app servers per host')
+    parser.add_argument ('-config-files', dest='config_files', type=int, default=len (config_files), help='configuration files per host')
+    parser.add_argument ('-log-files', dest='log_files', type=int, default=3, help='log files per host')
+    parser.add_argument ('-log-lines', dest='log_lines', type=int, default=200, help='lines per log file')
+    parser.add_argument ('-definitions', dest='definitions', type=int, default=2, help='CPF/SQL/trigger/schema definitions per database')
+    parser.add_argument ('-seed', dest='seed', type=int, default=1, help='random seed')
+    return parser
+
+def generate (args, path):
+    with open (path, 'w', encoding='utf-8') as out:
+        DumpGenerator (args).generate (out)
+
+def main ():
+    parser = make_parser ()
+    parser.add_argument ('-out', dest='out', default='-', help='dump file to write, - for stdout')
+    args = parser.parse_args()
+    if args.out == '-':
+        DumpGenerator (args).generate (sys.stdout)
+    else:
+        generate (args, args.out)
+
+
+if __name__ == '__main__':
+    main ()
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+
+# a stand-in for the MarkLogic REST bulk endpoint (POST /v1/documents, multipart/mixed) to try -load
+# against:  checks the auth, keeps connections alive, counts what comes in and can save the documents
+# (as out/uri) and their metadata (as out/uri.metadata.json)
+
+import os
+import re
+import json
+import base64
+import hashlib
+import signal
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class StandIn (BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    args = None
+    lock = threading.Lock ()
+    counts = {'requests': 0, 'documents': 0, 'bytes': 0, 'connections': 0}
+
+    def setup (self):
+        super ().setup ()
+        with self.lock:
+            self.counts['connections'] += 1
+
+    def log_message (self, format, *args):
+        if self.args.verbose:  super ().log_message (format, *args)
+
+    def reply (self, status, body, headers={}):
+        data = json.dumps (body).encode ('utf-8')
+        self.send_response (status)
+        self.send_header ('Content-Type', 'application/json')
+        self.send_header ('Content-Length', str (len (data)))
+        for key, value in headers.items ():
+            self.send_header (key, value)
+        self.end_headers ()
+        self.wfile.write (data)
+
+    def authorized (self):
+        args = self.args
+        if args.user is None:  return True
+        header = self.headers.get ('Authorization', '')
+        if args.auth == 'basic':
+            return header == 'Basic ' + base64.b64encode (f'{args.user}:{args.password}'.encode ('utf-8')).decode ('ascii')
+        if not header.startswith ('Digest '):  return False
+        fields = {key: quoted if quoted else plain for key, quoted, plain in re.findall (r'(\w+)=(?:"([^"]*)"|([^,\s]*))', header[7:])}
+        md5 = lambda text: hashlib.md5 (text.encode ('utf-8')).hexdigest ()
+        ha1 = md5 (f'{args.user}:{args.realm}:{args.password}')
+        ha2 = md5 (f'{self.command}:{fields.get ("uri", "")}')
+        expected = md5 (f'{ha1}:{fields.get ("nonce", "")}:{fields.get ("nc", "")}:{fields.get ("cnonce", "")}:auth:{ha2}')
+        return fields.get ('username') == args.user and fields.get ('nonce') == args.nonce and fields.get ('response') == expected
+
+    def do_POST (self):
+        body = self.rfile.read (int (self.headers.get ('Content-Length', 0)))
+        if not self.authorized ():
+            challenge = 'Basic realm="public"' if self.args.auth == 'basic' else f'Digest realm="{self.args.realm}", qop="auth", nonce="{self.args.nonce}", opaque="0"'
+            self.reply (401, {'errorResponse': {'statusCode': 401, 'message': 'Unauthenticated'}}, {'WWW-Authenticate': challenge})
+            return
+        if not self.path.startswith ('/v1/documents'):
+            self.reply (404, {'errorResponse': {'statusCode': 404, 'message': f'no {self.path}'}})
+            return
+        match = re.search (r'boundary=([^;\s]+)', self.headers.get ('Content-Type', ''))
+        if match is None:
+            self.reply (400, {'errorResponse': {'statusCode': 400, 'message': 'not multipart'}})
+            return
+        documents = []
+        for part in body.split (b'--' + match.group (1).encode ('ascii'))[1:-1]:
+            head, _, content = part[2:].partition (b'\r\n\r\n')
+            # each part ends with the CRLF before the next boundary
+            content = content[:-2]
+            uri = re.search (rb'filename="([^"]*)"', head).group (1).decode ('utf-8')
+            if b'category=metadata' in head:
+                self.save (uri + '.metadata.json', content)
+                continue
+            documents.append ({'uri': uri, 'category': ['metadata', 'content']})
+            self.save (uri, content)
+            with self.lock:
+                self.counts['bytes'] += len (content)
+        with self.lock:
+            self.counts['requests'] += 1
+            self.counts['documents'] += len (documents)
+        self.reply (200, {'documents': documents})
+
+    def save (self, uri, content):
+        if self.args.out is None:  return
+        path = os.path.join (self.args.out, uri.lstrip ('/'))
+        os.makedirs (os.path.dirname (path), exist_ok=True)
+        with open (path, 'wb') as f:
+            f.write (content)
+
+
+def main ():
+    parser = argparse.ArgumentParser (description='Stand-in for the MarkLogic REST bulk load endpoint.')
+    parser.add_argument ('-port', dest='port', type=int, default=8000, help='port, default 8000')
+    parser.add_argument ('-user', dest='user', default=None, help='user to require, none by default')
+    parser.add_argument ('-password', dest='password', default='', help='password to require')
+    parser.add_argument ('-auth', dest='auth', default='digest', choices=['digest', 'basic'], help='authentication, default digest')
+    parser.add_argument ('-out', dest='out', default=None, help='save the documents under this directory')
+    parser.add_argument ('-verbose', dest='verbose', action='store_true', help='log each request')
+    args = parser.parse_args ()
+    args.realm = 'public'
+    args.nonce = os.urandom (16).hex ()
+    StandIn.args = args
+
+    server = ThreadingHTTPServer (('127.0.0.1', args.port), StandIn)
+    # stop on kill too, to print the counts
+    signal.signal (signal.SIGTERM, signal.default_int_handler)
+    print (f'listening on http://127.0.0.1:{args.port}', flush=True)
+    try:
+        server.serve_forever ()
+    except KeyboardInterrupt:
+        pass
+    print (json.dumps (StandIn.counts))
+
+
+if __name__ == '__main__':
+    main ()
@@ -5,93 +5,195 @@ import os
 import sys
 import string
 import argparse
-import copy
-
+import mmap
+import array
+import threading
+import queue
+import io
+import gzip
+import bz2
+import lzma
+import zipfile
+import tarfile
+import time
+import functools
+import itertools
+import bisect
+import operator
+import contextlib
+import heapq
+import json
+import datetime
+import glob
+import collections
+import hashlib
+import base64
+import mimetypes
+import http.client
+import urllib.parse
+import fnmatch
+import shutil
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+# peak RSS is only there on unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# one level of a context:  frozen once another context shares it, so contexts can share frames
+class ContextFrame:
+    __slots__ = ('path', 'properties', 'parent', 'lookup')
+
+    def __init__(self, path, properties, parent=None):
+        self.path = path
+        self.properties = properties
+        self.parent = parent
+        # properties of this frame and all below it, built on first find
+        self.lookup = None
+
+    def find (self, key):
+        return self.find_all ().get (key)
+
+    def find_all (self):
+        if self.lookup is None:
+            self.lookup = {} if self.parent is None else dict (self.parent.find_all ())
+            self.lookup.update (self.properties)
+        return self.lookup
+
+
+# a stack of frames;  copies are O(1) and share all frames, changes copy the top frame first (copy on write)
 class DumpContext:
+    __slots__ = ('top', 'owned')
+
     def __init__(self, init_context=None):
+        # whether the top frame is ours alone and can be changed in place
+        self.owned = False
         if init_context is None:
-                self.path = []
-                self.properties = []
+                self.top = None
         else:
-                self.path = copy.deepcopy (init_context.path)
-                self.properties = copy.deepcopy (init_context.properties)
+                self.top = init_context.top
+                init_context.owned = False
 
     @staticmethod
     def copy_context (c):
-        return copy.deepcopy (c)
+        return DumpContext (c)
+
+    @property
+    def path (self):
+        return [frame.path for frame in self.frames ()]
+
+    @property
+    def properties (self):
+        return [frame.properties for frame in self.frames ()]
+
+    # bottom to top
+    def frames (self):
+        frames = []
+        frame = self.top
+        while frame is not None:
+            frames.append (frame)
+            frame = frame.parent
+        frames.reverse ()
+        return frames
 
     def find_property (self, key):
-        retval = None
-        for i in range (len (self.properties) - 1, -1, -1):
-            if key in self.properties[i]:
-                retval = self.properties[i][key]
-                break
-        return retval
+        return self.top.find (key)
+
+    # every property, nearest frame winning, as a new dict
+    def all_properties (self):
+        return dict (self.top.find_all ())
 
     def get_property (self, key):
         if self.has_property (key):
-            return self.properties[-1][key]
+            return self.top.properties[key]
         else:
             return None
 
     def set_property (self, key, value):
-        self.properties[-1][key] = value
+        self.top_properties()[key] = value
 
     def pop_property (self, key):
-        self.properties[-1].pop(key, None)
+        if key in self.top.properties:
+            self.top_properties().pop(key, None)
 
     def copy_self (self):
-        return copy.deepcopy (self)
+        return DumpContext (self)
 
     def push_context (self, path, properties):
-        self.path.append (path)
-        self.properties.append (properties)
+        self.top = ContextFrame (path, properties, self.top)
+        self.owned = True
 
     def pop_context (self):
-        self.path.pop ()
-        self.properties.pop ()
+        self.top = self.top.parent
+        self.owned = False
 
+    # the top properties, to be changed:  copies the top frame if it is shared
     def top_properties (self):
-        return self.properties[-1]
+        if not self.owned:
+            self.top = ContextFrame (self.top.path, dict (self.top.properties), self.top.parent)
+            self.owned = True
+        self.top.lookup = None
+        return self.top.properties
 
     def context_string (self):
         return repr (list (zip (self.path, self.properties)))
         #return f'{tuple (zip (self.path, self.properties))}'[0:256]
 
     def get_top_context (self):
-        return self.path[-1]
+        return self.top.path
 
     def at_top_context (self, path):
-        return path == self.path[-1]
+        return path == self.top.path
 
     # checks only top
     def has_property (self, key):
-        return key in self.properties[-1]
+        return key in self.top.properties
 
     def check_top_context (self, path):
-        if (path != self.path[-1]):
-            print (f'ERROR:  checking path {path} vs {self.path[-1]}, found mismatch.', file=sys.stderr)
+        if (path != self.top.path):
+            print (f'ERROR:  checking path {path} vs {self.top.path}, found mismatch.', file=sys.stderr)
         
 
 
+# there are a lot of these, so no __dict__, and nothing made that most blocks never need:  separators
+# all share their one line, files is a list from the first one added, the context comes with classifying
 class DumpBlock:
+    __slots__ = ('type', 'files', 'text', 'start_line', 'flags', 'seconds', 'context')
+
     def __init__(self, type='text', name='', init_context=None):
         # all start out this way
         self.type = type
-        self.files = []
-        self.text = []
+        self.files = ()
+        self.text = separator_lines.get (type) or []
         self.start_line = 0
         self.flags = ''
+        # time spent on it, for -stats
+        self.seconds = 0.0
         if init_context is None:
-                self.context = DumpContext()
+                self.context = None
         else:
                 self.context = DumpContext.copy_context (init_context)
-       
+
     def at_top_context (self, path):
         return self.context.at_top_context (path) 
 
-    def add_line (self, line):
-        self.text.append (line)
+    # lines first to last go to path
+    def add_file (self, path, first, last):
+        if not self.files:  self.files = []
+        self.files.append ((path, (first, last)))
 
     def add_flag (self, flag):
         self.flags = flag
@@ -113,6 +215,1525 @@ class DumpBlock:
         for line in self.text:
             print (line)
 
+# the dump file, memory mapped, for blocks that keep only line offsets
+class DumpSource:
+    def __init__(self, path):
+        self.file = open (path, 'rb')
+        size = os.fstat (self.file.fileno()).st_size
+        # can't map an empty file
+        self.map = mmap.mmap (self.file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+        self.view = memoryview (self.map)
+
+    def text (self, start, end):
+        return self.map[start:end].decode ('utf-8')
+
+    # (start, end) offsets of about size bytes each from start up to end, each ending with a whole line;
+    # with ahead, the kernel is asked to read that many chunks past the one handed out in the background
+    def chunks (self, start=0, end=None, size=1 << 20, ahead=0):
+        if end is None:  end = len (self.map)
+        while start < end:
+            if ahead > 0 and hasattr (self.map, 'madvise') and hasattr (mmap, 'MADV_WILLNEED'):
+                page = start - start % mmap.PAGESIZE
+                self.map.madvise (mmap.MADV_WILLNEED, page, min ((ahead + 1) * size, len (self.map) - page))
+            stop = min (start + size, end)
+            if stop < end:
+                newline = self.map.rfind (b'\n', start, stop)
+                if newline < 0:  newline = self.map.find (b'\n', stop, end)
+                stop = newline + 1 if newline >= 0 else end
+            yield start, stop
+            start = stop
+
+    # straight from the dump to the output file, in the kernel when it can
+    def copy_to (self, f, start, end):
+        f.flush ()
+        if hasattr (os, 'copy_file_range'):
+            try:
+                while start < end:
+                    copied = os.copy_file_range (self.file.fileno(), f.fileno(), end - start, start)
+                    if copied == 0:  break
+                    start += copied
+            except OSError:
+                # append mode, other filesystems, old kernels
+                pass
+        if start < end:
+            f.write (self.view[start:end])
+
+    def close (self):
+        self.view.release ()
+        try:
+            if len (self.map) > 0:  self.map.close ()
+        except BufferError:
+            # memoryviews of it still out (iter_files), it closes when they go
+            pass
+        self.file.close ()
+
+
+element_tag_pattern = re.compile (r'\s*<(/?)([^>\s]+)')
+singleton_pattern = re.compile (r'<[^<]+/>\s*')
+report_host_pattern = re.compile (r'Report Host:\s+')
+hostname_pattern = re.compile (r'Hostname:\s+')
+# <prefix:name>value</prefix:name>, any element with just text
+simple_element_pattern = re.compile (r'\s*<(?:[^>\s:/]+:)?([^>\s:/]+)>([^<]*)</')
+number_pattern = re.compile (r'-?\d+(\.\d+)?')
+# whitespace strip() takes off that bytes.strip() doesn't, as utf-8, and the bytes it can start with
+unicode_space = rb'(?:[\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)'
+unicode_space_leads = (b'\x1c', b'\x1d', b'\x1e', b'\x1f', b'\xc2', b'\xe1', b'\xe2', b'\xe3')
+unicode_space_pattern = re.compile (unicode_space)
+# that whitespace just after a newline, or just before one
+line_start_space_pattern = re.compile (rb'\n' + unicode_space)
+line_end_space_pattern = re.compile (unicode_space + rb'\n')
+separator_block_types = {'=': 'subsep', '#': 'sep', '%': 'bigsep'}
+# the stripped line of each type of separator block
+separator_lines = {type: (char * 75,) for char, type in separator_block_types.items ()}
+
+# (offset, character) of each separator line in a chunk of text or utf-8 bytes, in order;  found by
+# searching for the runs of the separator characters, so the lines in between are never looked at
+def find_separators (data):
+    text = isinstance (data, str)
+    newline = '\n' if text else b'\n'
+    found = []
+    for char in separator_block_types:
+        run = char * 75
+        pattern = run if text else run.encode ()
+        i = data.find (pattern)
+        while i >= 0:
+            start = data.rfind (newline, 0, i) + 1
+            end = data.find (newline, i)
+            if end < 0:  end = len (data)
+            line = data[start:end] if text else data[start:end].decode ('utf-8')
+            if line.strip () == run:  found.append ((start, char))
+            i = data.find (pattern, end)
+    found.sort ()
+    return found
+
+# the first line from offset start up to end of data that isn't blank, stripped, or None
+def first_text_line (data, start, end):
+    while start < end:
+        stop = data.find (b'\n', start, end)
+        if stop < 0:  stop = end
+        line = data[start:stop].decode ('utf-8').strip ()
+        if len (line) > 0:  return line
+        start = stop + 1
+    return None
+
+# a binary stream in pieces of about size bytes that end with whole lines, up to length bytes if given
+def read_chunks (f, length=None, size=1 << 20):
+    rest = b''
+    while length is None or length > 0:
+        data = f.read (size if length is None else min (size, length))
+        if not data:  break
+        if length is not None:  length -= len (data)
+        data = rest + data
+        cut = data.rfind (b'\n') + 1
+        rest = data[cut:]
+        if cut > 0:  yield data[:cut]
+    if rest:  yield rest
+
+# the items of an iterator made on a thread of its own, at most depth of them ahead of the caller, so
+# reading (and decompressing) the dump overlaps parsing it;  close it to stop the thread
+def read_ahead (items, depth):
+    ready = queue.Queue (depth)
+    stop = threading.Event ()
+    end = object ()
+    def offer (item):
+        while not stop.is_set ():
+            try:
+                ready.put (item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    def produce ():
+        try:
+            for item in items:
+                if not offer (item):  return
+            offer (end)
+        except BaseException as e:
+            offer (e)
+    thread = threading.Thread (target=produce, name='dumparse-reader', daemon=True)
+    thread.start ()
+    try:
+        while True:
+            item = ready.get ()
+            if item is end:  return
+            if isinstance (item, BaseException):  raise item
+            yield item
+    finally:
+        stop.set ()
+        thread.join ()
+
+# a chunk decoded the way a text file reads, with any of \n, \r\n or \r ending lines
+def text_chunk (chunk):
+    return chunk.decode ('utf-8').replace ('\r\n', '\n').replace ('\r', '\n')
+
+# 2020-09-13 12:26:40.123 at the start of a log line
+log_time_pattern = re.compile (r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(\.\d+)?')
+
+# <element_name>value</element_name> at the start of a line, element names can be a|b|c
+@functools.lru_cache (maxsize=None)
+def xml_value_pattern (element_name):
+    return re.compile (f'<({element_name})>(.*)</\\1>')
+
+
+# magic bytes at the start of compressed dumps
+compression_magic = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bzip2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'PK\x03\x04', 'zip'),
+]
+
+def dump_compression (path):
+    with open (path, 'rb') as f:
+        return magic_compression (f.read (6))
+
+def magic_compression (magic):
+    for prefix, compression in compression_magic:
+        if magic.startswith (prefix):
+            return compression
+    return None
+
+def need_zstandard ():
+    if zstandard is None:
+        raise RuntimeError ('zstd needs the zstandard module (pip install zstandard)')
+
+# the dump as a binary stream, decompressed as it is read
+def open_dump (path):
+    compression = dump_compression (path)
+    if compression == 'gzip':
+        return gzip.open (path, 'rb')
+    elif compression == 'bzip2':
+        return bz2.open (path, 'rb')
+    elif compression == 'xz':
+        return lzma.open (path, 'rb')
+    elif compression == 'zstd':
+        need_zstandard ()
+        return zstandard.ZstdDecompressor ().stream_reader (open (path, 'rb'), closefd=True)
+    elif compression == 'zip':
+        return zip_dump (zipfile.ZipFile (path), path)
+    else:
+        return open (path, 'rb')
+
+# the dump is the biggest file in a zip
+def zip_dump (archive, name):
+    members = [info for info in archive.infolist () if not info.is_dir ()]
+    if len (members) == 0:  raise RuntimeError (f'no files in {name}')
+    return archive.open (max (members, key=lambda info: info.file_size))
+
+# a binary stream of the dump, decompressed the way its first bytes say;  closing what comes back
+# leaves the stream open.  One that can neither seek nor peek is taken as it is
+def open_dump_stream (f):
+    if f.seekable ():
+        position = f.tell ()
+        magic = f.read (6)
+        f.seek (position)
+    elif hasattr (f, 'peek'):
+        magic = f.peek (6)[:6]
+    else:
+        return contextlib.nullcontext (f)
+    compression = magic_compression (magic)
+    if compression == 'gzip':
+        return gzip.GzipFile (fileobj=f, mode='rb')
+    elif compression == 'bzip2':
+        return bz2.BZ2File (f)
+    elif compression == 'xz':
+        return lzma.LZMAFile (f)
+    elif compression == 'zstd':
+        need_zstandard ()
+        return zstandard.ZstdDecompressor ().stream_reader (f, closefd=False)
+    elif compression == 'zip':
+        return zip_dump (zipfile.ZipFile (f), 'the zip stream')
+    else:
+        return contextlib.nullcontext (f)
+
+
+# a block's lines as offsets into the source, stripped lines are decoded when asked for
+class DumpLines:
+    __slots__ = ('source', 'starts', 'clean', 'end')
+
+    def __init__(self, source):
+        self.source = source
+        self.starts = array.array ('Q')
+        # 1 if stripping the line only takes off its newline, so it can be copied as is
+        self.clean = bytearray ()
+        self.end = 0
+
+    def extend (self, starts, clean, end):
+        self.starts.extend (starts)
+        self.clean.extend (clean)
+        self.end = end
+
+    def line_end (self, i):
+        return self.starts[i + 1] if i + 1 < len (self.starts) else self.end
+
+    def line (self, i):
+        return self.source.text (self.starts[i], self.line_end (i)).strip ()
+
+    def __len__ (self):
+        return len (self.starts)
+
+    def __getitem__ (self, i):
+        if isinstance (i, slice):
+            return [self.line (j) for j in range (*i.indices (len (self.starts)))]
+        if i < 0:  i += len (self.starts)
+        if i < 0 or i >= len (self.starts):  raise IndexError ('line index out of range')
+        return self.line (i)
+
+    def __iter__ (self):
+        for i in range (len (self.starts)):
+            yield self.line (i)
+
+    # output for lines first to last:  (source, start, end) ranges for runs of clean lines, bytes for the rest
+    def pieces (self, first, last):
+        i = first
+        while i <= last:
+            j = self.clean.find (0, i, last + 1)
+            if j == -1:  j = last + 1
+            if j > i:  yield (self.source, self.starts[i], self.line_end (j - 1))
+            if j <= last:  yield (self.line (j) + '\n').encode ('utf-8')
+            i = j + 1
+
+    # [start, end, clean] for runs of lines first to last that are all clean or all not
+    def runs (self, first, last):
+        runs = []
+        for i in range (first, last + 1):
+            clean = self.clean[i]
+            if len (runs) > 0 and runs[-1][2] == clean:
+                runs[-1][1] = self.line_end (i)
+            else:
+                runs.append ([self.starts[i], self.line_end (i), clean])
+        return runs
+
+
+# writes the output files, on a pool of threads if there is more than one worker;
+# writes to the same path are done in the order they came in, by one thread at a time
+class DumpWriter:
+    def __init__(self, workers=1, compress=None, background=False):
+        self.workers = workers
+        # 'gzip' writes each file as file.gz
+        self.compress = compress
+        self.made_dirs = set ()
+        # background writes even a single worker on a thread, so the parsing doesn't wait on it
+        self.pool = ThreadPoolExecutor (workers, thread_name_prefix='dumparse-writer') if workers > 1 or background else None
+        self.lock = threading.Lock ()
+        # path -> [(mode, pieces)] still to write, while a thread has the path
+        self.pending = {}
+        # bounds the files waiting in memory;  more in the background, to ride out runs of small files
+        self.slots = threading.BoundedSemaphore (max (workers * 4, 64) if background else workers * 4)
+        self.error = None
+        # the tree was made with -store before, so its files may be hard links into the store
+        self.store_links = False
+
+    # pieces are bytes, or (source, start, end) ranges to copy from a DumpSource;  done is called once it is written
+    def write (self, path, mode, pieces, done=None):
+        if self.pool is None:
+            self.write_file (path, mode, pieces)
+            if done is not None:  done ()
+            return
+        self.slots.acquire ()
+        with self.lock:
+            queued = path in self.pending
+            self.pending.setdefault (path, []).append ((mode, pieces, done))
+        if not queued:
+            self.pool.submit (self.drain, path)
+        if self.error:  raise self.error
+
+    def drain (self, path):
+        while True:
+            with self.lock:
+                jobs = self.pending[path]
+                if len (jobs) == 0:
+                    del self.pending[path]
+                    return
+                self.pending[path] = []
+            for mode, pieces, done in jobs:
+                try:
+                    self.write_file (path, mode, pieces)
+                    if done is not None:  done ()
+                except Exception as e:
+                    if self.error is None:  self.error = e
+                finally:
+                    self.slots.release ()
+
+    def write_file (self, path, mode, pieces):
+        dirs = os.path.dirname (path)
+        if dirs not in self.made_dirs:
+            os.makedirs (dirs, 0o777, True)
+            self.made_dirs.add (dirs)
+        # a hard link into a -store, from an earlier run:  replace it, don't write through it
+        if self.store_links and mode == 'w' and os.path.exists (path) and os.stat (path).st_nlink > 1:
+            os.unlink (path)
+        if self.compress == 'gzip':
+            # appending adds another gzip member, which reads back as one stream
+            with gzip.open (path + '.gz', mode + 'b') as f:
+                for piece in pieces:
+                    f.write (piece_data (piece))
+            return
+        with open (path, mode + 'b') as f:
+            for piece in pieces:
+                if isinstance (piece, tuple):
+                    piece[0].copy_to (f, piece[1], piece[2])
+                else:
+                    f.write (piece)
+
+    # wait for all the writes
+    def close (self):
+        if self.pool is not None:
+            self.pool.shutdown (wait=True)
+            self.pool = None
+        if self.error:  raise self.error
+
+
+def piece_data (piece):
+    if isinstance (piece, tuple):
+        return piece[0].view[piece[1]:piece[2]]
+    return piece
+
+
+# writes the output tree into one archive (.tar, .tar.gz, .tar.bz2, .tar.xz, .tar.zst or .zip) instead of files;
+# a member can't be appended to once it is in, so a file is held until a write to another path comes
+class DumpArchive:
+    def __init__(self, path):
+        self.path = path
+        self.zip = None
+        self.tar = None
+        self.zstd_file = None
+        if path.endswith ('.zip'):
+            self.zip = zipfile.ZipFile (path, 'w', zipfile.ZIP_DEFLATED)
+        elif path.endswith ('.tar.zst') or path.endswith ('.tzst'):
+            need_zstandard ()
+            self.zstd_file = zstandard.ZstdCompressor ().stream_writer (open (path, 'wb'))
+            self.tar = tarfile.open (fileobj=self.zstd_file, mode='w|')
+        elif path.endswith ('.tar.gz') or path.endswith ('.tgz'):
+            self.tar = tarfile.open (path, 'w:gz')
+        elif path.endswith ('.tar.bz2'):
+            self.tar = tarfile.open (path, 'w:bz2')
+        elif path.endswith ('.tar.xz'):
+            self.tar = tarfile.open (path, 'w:xz')
+        elif path.endswith ('.tar'):
+            self.tar = tarfile.open (path, 'w')
+        else:
+            raise ValueError (f'unknown archive type for {path}, use .zip, .tar, .tar.gz, .tar.bz2, .tar.xz or .tar.zst')
+        self.pending_path = None
+        self.pending = []
+        self.added = set ()
+
+    def write (self, path, mode, pieces):
+        name = os.path.normpath (path)
+        if name != self.pending_path or mode != 'a':
+            self.add_pending ()
+            if mode == 'a' and name in self.added:
+                print (f'WARNING:  {name} is already in the archive, appended part added as another member', file=sys.stderr)
+            self.pending_path = name
+        self.pending.extend (bytes (piece_data (piece)) for piece in pieces)
+
+    def add_pending (self):
+        if self.pending_path is None:  return
+        data = b''.join (self.pending)
+        if self.zip is not None:
+            self.zip.writestr (self.pending_path, data)
+        else:
+            info = tarfile.TarInfo (self.pending_path)
+            info.size = len (data)
+            info.mtime = time.time ()
+            info.mode = 0o644
+            self.tar.addfile (info, io.BytesIO (data))
+        self.added.add (self.pending_path)
+        self.pending_path = None
+        self.pending = []
+
+    def close (self):
+        self.add_pending ()
+        if self.zip is not None:
+            self.zip.close ()
+        if self.tar is not None:
+            self.tar.close ()
+        if self.zstd_file is not None:
+            self.zstd_file.close ()
+        self.zip = self.tar = self.zstd_file = None
+
+
+# writes each output file once into a content-addressed store (store/ab/cdef..., by sha256) and hard
+# links it into the tree, so files the same across hosts and across dumps take the space once and are
+# only written once;  content-hashes.txt in out-dir lists the hash of every file, like sha256sum does.
+# A file is complete when a write to another path comes, as for an archive;  until then its pieces are
+# kept, or spilled to a temporary file in the store once they are more than spill_size
+class DumpStore:
+    hashes_name = 'content-hashes.txt'
+    spill_size = 64 << 20
+
+    def __init__(self, store_dir, out_dir='./Support-Dump'):
+        self.store_dir = store_dir
+        self.out_dir = out_dir
+        self.temporary_dir = os.path.join (store_dir, 'tmp')
+        os.makedirs (self.temporary_dir, 0o777, True)
+        os.makedirs (out_dir, 0o777, True)
+        # appends of one line are a single write, so processes can share the list
+        self.hashes_fd = os.open (os.path.join (out_dir, self.hashes_name), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        self.made_dirs = set ()
+        # path -> sha256 of the files done
+        self.done = {}
+        self.copy_warned = False
+        self.start (None)
+
+    def start (self, path):
+        self.path = path
+        self.pieces = []
+        self.callbacks = []
+        self.digest = hashlib.sha256 ()
+        self.size = 0
+        self.spill = None
+
+    def blob (self, digest):
+        return os.path.join (self.store_dir, digest[:2], digest[2:])
+
+    def write (self, path, mode, pieces, done=None):
+        path = os.path.normpath (path)
+        if path != self.path or mode != 'a':
+            self.finish ()
+            self.start (path)
+            # appending to a file that is done already, so start from what it has
+            if mode == 'a' and path in self.done:
+                with open (self.blob (self.done[path]), 'rb') as f:
+                    self.add (f.read ())
+        for piece in pieces:
+            self.add (piece)
+        if done is not None:  self.callbacks.append (done)
+
+    def add (self, piece):
+        data = piece_data (piece)
+        self.digest.update (data)
+        self.size += len (data)
+        if self.spill is not None:
+            self.spill.write (data)
+            return
+        self.pieces.append (piece)
+        if self.size > self.spill_size:
+            self.spill = tempfile.NamedTemporaryFile (dir=self.temporary_dir, delete=False)
+            for piece in self.pieces:
+                self.spill.write (piece_data (piece))
+            self.pieces = []
+
+    # put the file in the store if it isn't there, and link it into the tree
+    def finish (self):
+        if self.path is None:  return
+        digest = self.digest.hexdigest ()
+        blob = self.blob (digest)
+        if os.path.exists (blob):
+            if self.spill is not None:
+                self.spill.close ()
+                os.unlink (self.spill.name)
+        else:
+            if self.spill is None:
+                self.spill = tempfile.NamedTemporaryFile (dir=self.temporary_dir, delete=False)
+                for piece in self.pieces:
+                    self.spill.write (piece_data (piece))
+            self.spill.close ()
+            # read only, so nothing writes through one link into all the others
+            os.chmod (self.spill.name, 0o444)
+            os.makedirs (os.path.dirname (blob), 0o777, True)
+            # another process may have just stored it too, either is fine
+            os.replace (self.spill.name, blob)
+        self.link (blob, self.path)
+        self.done[self.path] = digest
+        os.write (self.hashes_fd, f'{digest}  {os.path.relpath (self.path, self.out_dir)}\n'.encode ('utf-8'))
+        for callback in self.callbacks:
+            callback ()
+        self.start (None)
+
+    def link (self, blob, path):
+        dirs = os.path.dirname (path)
+        if dirs not in self.made_dirs:
+            os.makedirs (dirs, 0o777, True)
+            self.made_dirs.add (dirs)
+        if os.path.lexists (path):  os.unlink (path)
+        try:
+            os.link (blob, path)
+        except OSError as e:
+            # another filesystem, or one without hard links
+            if not self.copy_warned:
+                print (f'WARNING:  can\'t hard link from {self.store_dir} ({e.strerror}), copying the files instead', file=sys.stderr)
+                self.copy_warned = True
+            shutil.copyfile (blob, path)
+
+    def close (self):
+        self.finish ()
+        os.close (self.hashes_fd)
+
+    # content-hashes.txt sorted by path, with the last hash of any path done more than once;  an
+    # old one is cleared first with start_hashes, as every run (and -jobs process) appends to it
+    @classmethod
+    def start_hashes (cls, out_dir):
+        path = os.path.join (out_dir, cls.hashes_name)
+        if os.path.exists (path):  os.unlink (path)
+
+    @classmethod
+    def read_hashes (cls, out_dir):
+        hashes = {}
+        with open (os.path.join (out_dir, cls.hashes_name), encoding='utf-8') as f:
+            for line in f:
+                digest, path = line.rstrip ('\n').split ('  ', 1)
+                hashes[path] = digest
+        return hashes
+
+    @classmethod
+    def sort_hashes (cls, out_dir):
+        hashes = cls.read_hashes (out_dir)
+        path = os.path.join (out_dir, cls.hashes_name)
+        with open (path + '.tmp', 'w', encoding='utf-8') as f:
+            for name in sorted (hashes):
+                f.write (f'{hashes[name]}  {name}\n')
+        os.replace (path + '.tmp', path)
+
+    # (changed, added, removed) paths between two trees' content hashes
+    @classmethod
+    def changes (cls, old_dir, new_dir):
+        old, new = cls.read_hashes (old_dir), cls.read_hashes (new_dir)
+        changed = sorted (path for path in new if path in old and old[path] != new[path])
+        added = sorted (path for path in new if path not in old)
+        removed = sorted (path for path in old if path not in new)
+        return changed, added, removed
+
+
+# a configuration file as a tree of Merkle hashes, for -config-diff:  an element's hash covers its name,
+# attributes and text and its children's hashes in sorted order, so equal subtrees compare in one step
+# and the order of children doesn't count, as with the normalize databases.xml query in dumparse.xml
+class ConfigTree:
+    __slots__ = ('name', 'text', 'attributes', 'children', 'hash')
+
+    def __init__(self, element):
+        self.name = element.tag.rpartition ('}')[2]
+        self.text = (element.text or '').strip ()
+        self.attributes = sorted ((name.rpartition ('}')[2], value) for name, value in element.attrib.items ())
+        self.children = [ConfigTree (child) for child in element]
+        digest = hashlib.blake2b (digest_size=16)
+        digest.update (json.dumps ([self.name, self.text, self.attributes]).encode ('utf-8'))
+        for child_hash in sorted (child.hash for child in self.children):
+            digest.update (child_hash)
+        self.hash = digest.digest ()
+
+    # None if it isn't well formed xml
+    @classmethod
+    def read (cls, path):
+        try:
+            return cls (ElementTree.parse (path).getroot ())
+        except ElementTree.ParseError as e:
+            print (f'WARNING:  {path} is not well formed, not compared ({e})', file=sys.stderr)
+            return None
+
+    def child_text (self, name):
+        for child in self.children:
+            if child.name == name:  return child.text
+        return None
+
+    # what tells an element from its siblings of the same name:  its own name or id (database-name,
+    # forest-id, ...), or the localname of an index, or else its position
+    def identity (self):
+        for suffix in ('-name', '-id', 'path'):
+            for child in self.children:
+                if child.name.endswith (suffix) and child.text and not child.children:
+                    return child.text
+        if self.child_text ('localname') is not None:
+            return '+'.join (filter (None, (self.child_text (name) for name in ('localname', 'parent-localname', 'namespace-uri'))))
+        return None
+
+    # children by name;  the names in repeated (more than one of them on either side) also get an
+    # identity, text or position, to tell them apart
+    def keyed_children (self, repeated):
+        keyed = {}
+        positions = collections.Counter ()
+        for child in self.children:
+            positions[child.name] += 1
+            if child.name not in repeated:
+                key = child.name
+            else:
+                identity = child.identity ()
+                if identity is not None:
+                    key = f'{child.name}[{identity}]'
+                elif not child.children:
+                    # lists like forest-id:  what is in them is what counts
+                    key = f'{child.name}[{child.text}]'
+                else:
+                    key = f'{child.name}[{positions[child.name]}]'
+            # the same identity twice
+            while key in keyed:  key += "'"
+            keyed[key] = child
+        return keyed
+
+    # (kind, path, old value, new value) for what differs from old, skipping the subtrees that hash the same
+    def changes (self, old, path=None):
+        if path is None:  path = self.name
+        if self.hash == old.hash:  return
+        if self.text != old.text:
+            yield ('changed', path, old.text, self.text)
+        old_attributes, attributes = dict (old.attributes), dict (self.attributes)
+        for name in sorted (set (old_attributes) | set (attributes)):
+            if old_attributes.get (name) != attributes.get (name):
+                yield ('changed', f'{path}/@{name}', old_attributes.get (name), attributes.get (name))
+        counts = collections.Counter (child.name for child in self.children) | collections.Counter (child.name for child in old.children)
+        repeated = {name for name, count in counts.items () if count > 1}
+        old_children, children = old.keyed_children (repeated), self.keyed_children (repeated)
+        for key, child in children.items ():
+            if key not in old_children:
+                yield ('added', f'{path}/{key}', None, None)
+            elif child.hash != old_children[key].hash:
+                yield from child.changes (old_children[key], f'{path}/{key}')
+        for key in old_children:
+            if key not in children:
+                yield ('removed', f'{path}/{key}', None, None)
+
+
+# compare the configuration files of two output trees, or with one tree, each host's with the first
+# host's;  files that are byte for byte the same aren't even parsed
+def config_diff (trees):
+    pairs = []
+    if len (trees) == 1:
+        by_name = collections.defaultdict (list)
+        for path in sorted (glob.glob (os.path.join (trees[0], '*', '*', 'Configuration', '*.xml'))):
+            by_name[os.path.basename (path)].append (path)
+        for paths in by_name.values ():
+            pairs.extend ((paths[0], path) for path in paths[1:])
+    else:
+        old_dir, new_dir = trees[0], trees[1]
+        old_files = {os.path.relpath (path, old_dir) for path in glob.glob (os.path.join (old_dir, '*', '*', 'Configuration', '*.xml'))}
+        new_files = {os.path.relpath (path, new_dir) for path in glob.glob (os.path.join (new_dir, '*', '*', 'Configuration', '*.xml'))}
+        for name in sorted (old_files - new_files):
+            print (f'removed  {name}')
+        for name in sorted (new_files - old_files):
+            print (f'added    {name}')
+        pairs.extend ((os.path.join (old_dir, name), os.path.join (new_dir, name)) for name in sorted (old_files & new_files))
+    different = 0
+    trees_read = {}
+    for old_path, new_path in pairs:
+        if file_digest (old_path) == file_digest (new_path):  continue
+        for path in (old_path, new_path):
+            if path not in trees_read:  trees_read[path] = ConfigTree.read (path)
+        old, new = trees_read[old_path], trees_read[new_path]
+        if old is None or new is None:  continue
+        changes = list (new.changes (old))
+        if len (changes) == 0:  continue
+        different += 1
+        print (f'{new_path}  (against {old_path})')
+        for kind, path, old_value, new_value in changes:
+            print (f'  {kind:8} {path}' + (f':  {old_value} -> {new_value}' if kind == 'changed' else ''))
+    print (f'{len (pairs)} configuration files compared, {different} with differences')
+
+@functools.lru_cache (maxsize=None)
+def file_digest (path):
+    with open (path, 'rb') as f:
+        return hashlib.sha256 (f.read ()).digest ()
+
+
+# a manifest of what has been written to out-dir, for -resume:  a json line for each piece (segment) of a file,
+# with its offset, length, sha256 and the dump lines it came from, put down once the piece is written;
+# a rerun skips the pieces the manifest has and the file is long enough for, truncates a file back to the
+# first piece that differs and writes from there, so appends don't pile up and a killed run picks up
+# where it stopped
+class DumpJournal:
+    name = '.dumparse-manifest.jsonl'
+
+    def __init__(self, out_dir='./Support-Dump'):
+        self.out_dir = out_dir
+        self.path = os.path.join (out_dir, self.name)
+        self.segments = self.read_manifest (self.path)
+        os.makedirs (out_dir, 0o777, True)
+        # appends of one line are a single write, so processes can share the manifest
+        self.fd = os.open (self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        # path -> [segments so far, offset, writing, size at the start]
+        self.files = {}
+        self.lock = threading.Lock ()
+        self.skipped = 0
+        self.written = 0
+
+    # (relative path, segment) -> the latest entry for it;  a 'segments' line ends a file at that many
+    @staticmethod
+    def read_manifest (path):
+        segments = {}
+        if not os.path.exists (path):  return segments
+        with open (path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads (line)
+                except ValueError:
+                    # the last line of a killed run
+                    continue
+                if 'segments' in entry:
+                    for key in [key for key in segments if key[0] == entry['path'] and key[1] >= entry['segments']]:
+                        del segments[key]
+                else:
+                    segments[(entry['path'], entry['segment'])] = entry
+        return segments
+
+    def file_size (self, path):
+        try:
+            return os.path.getsize (path)
+        except OSError:
+            return -1
+
+    # the mode to write this piece with and what to call once it is written, or (None, None) to skip it
+    def segment (self, path, mode, pieces, lines):
+        state = self.files.get (path)
+        if state is None or mode == 'w':
+            state = self.files[path] = [0, 0, False, self.file_size (path) if state is None else state[3]]
+        number, offset, writing, size = state
+        digest = hashlib.sha256 ()
+        length = 0
+        for piece in pieces:
+            data = piece_data (piece)
+            digest.update (data)
+            length += len (data)
+        entry = {'path': os.path.relpath (path, self.out_dir), 'segment': number, 'offset': offset,
+                 'length': length, 'sha256': digest.hexdigest (), 'lines': lines}
+        state[0] += 1
+        state[1] += length
+        if not writing:
+            prior = self.segments.get ((entry['path'], number))
+            if prior is not None and prior['offset'] == offset and prior['length'] == length and prior['sha256'] == entry['sha256'] and size >= offset + length:
+                self.skipped += 1
+                return None, None
+            # from here on it is all written
+            state[2] = True
+            if offset > 0:  os.truncate (path, offset)
+        return ('w' if offset == 0 else 'a'), lambda: self.record (entry)
+
+    def record (self, entry):
+        os.write (self.fd, (json.dumps (entry) + '\n').encode ('utf-8'))
+        with self.lock:
+            self.written += 1
+
+    # after the writer is closed:  cut files that were all skipped to what this run has in them
+    def close (self):
+        for path, (number, offset, writing, size) in self.files.items ():
+            if not writing and size > offset:  os.truncate (path, offset)
+            os.write (self.fd, (json.dumps ({'path': os.path.relpath (path, self.out_dir), 'segments': number}) + '\n').encode ('utf-8'))
+        os.close (self.fd)
+
+    # rewrite the manifest with only the latest entries
+    def compact (self):
+        segments = self.read_manifest (self.path)
+        temporary = self.path + '.tmp'
+        with open (temporary, 'w', encoding='utf-8') as f:
+            for key in sorted (segments):
+                f.write (json.dumps (segments[key]) + '\n')
+        os.replace (temporary, self.path)
+
+
+# the output files as (path relative to out-dir, context properties, data) records instead of writes,
+# for iter_files;  an append right after a write to the same path is joined onto its record
+class DumpRecords:
+    def __init__(self):
+        self.ready = collections.deque ()
+        # [path, context, pieces] until a write to another path comes
+        self.pending = None
+        self.done = set ()
+
+    def add (self, block, path, mode, pieces):
+        if self.pending is not None and self.pending[0] == path and mode == 'a':
+            self.pending[2].extend (pieces)
+            return
+        self.flush ()
+        if mode == 'a' and path in self.done:
+            print (f'WARNING:  {path} was already given out, appended part is another record', file=sys.stderr)
+        self.pending = [path, block.context, list (pieces)]
+
+    def flush (self):
+        if self.pending is None:  return
+        path, context, pieces = self.pending
+        # one range of a memory mapped dump is handed out as is
+        if len (pieces) == 1 and isinstance (pieces[0], tuple):
+            data = piece_data (pieces[0])
+        else:
+            data = b''.join (piece_data (piece) for piece in pieces)
+        properties = context.all_properties ()
+        properties['section'] = context.get_top_context ()
+        # the host and group in the path, or none for cluster-wide files, not the dump frame's report host
+        for key, value in zip (('host', 'group'), DumpFilter.host_group (context)):
+            if value is None:  properties.pop (key, None)
+            else:  properties[key] = value
+        self.ready.append ((os.path.relpath (path, context.find_property ('out-dir')), properties, data))
+        self.done.add (path)
+        self.pending = None
+
+    def take (self):
+        while self.ready:
+            yield self.ready.popleft ()
+
+
+# loads output records (iter_files) into MarkLogic through the REST bulk endpoint, POST /v1/documents
+# with a multipart/mixed body, instead of writing them for mlcp;  batches go out on a pool of threads,
+# each with its own keep-alive connection.  URIs are the absolute path the file would have been
+# written to, as mlcp makes them, unless there is a uri_prefix
+class DumpLoader:
+    # context properties that aren't worth keeping as metadata
+    internal_properties = ('out-dir', 'subtype', 'header', 'write-mode', 'filtered')
+
+    def __init__(self, url, user=None, password=None, auth='digest', collections=('exp',), database=None,
+                 batch_size=100, batch_bytes=8 * 1024 * 1024, threads=4, uri_prefix=None):
+        parts = urllib.parse.urlsplit (url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError (f'can\'t load to {url}, it needs to be http:// or https://')
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc.rpartition ('@')[2]
+        self.base_path = parts.path.rstrip ('/')
+        self.user = user
+        self.password = password
+        if auth not in ('digest', 'basic'):
+            raise ValueError (f'unknown auth {auth}, use digest or basic')
+        self.auth = auth
+        self.collections = list (collections)
+        self.database = database
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.uri_prefix = uri_prefix
+        self.pool = ThreadPoolExecutor (threads)
+        # bounds the batches waiting in memory
+        self.slots = threading.BoundedSemaphore (threads * 2)
+        self.local = threading.local ()
+        self.lock = threading.Lock ()
+        self.connections = []
+        self.batch = []
+        self.batch_size_bytes = 0
+        self.error = None
+        self.documents = 0
+        self.bytes = 0
+        self.batches = 0
+
+    def uri (self, path, properties):
+        if self.uri_prefix is not None:
+            return self.uri_prefix + path
+        uri = os.path.abspath (os.path.join (properties.get ('out-dir', '.'), path)).replace (os.sep, '/')
+        return uri if uri.startswith ('/') else '/' + uri
+
+    def metadata (self, properties):
+        values = {key: value for key, value in properties.items () if key not in self.internal_properties and isinstance (value, str)}
+        return {'collections': self.collections, 'metadataValues': values}
+
+    # records are (path relative to out-dir, context properties, data)
+    def load (self, records):
+        for path, properties, data in records:
+            self.add (self.uri (path, properties), self.metadata (properties), data)
+        self.close ()
+
+    def add (self, uri, metadata, data):
+        if self.error:  raise self.error
+        self.batch.append ((uri, metadata, data))
+        self.batch_size_bytes += len (data)
+        if len (self.batch) >= self.batch_size or self.batch_size_bytes >= self.batch_bytes:
+            self.submit ()
+
+    def submit (self):
+        if len (self.batch) == 0:  return
+        self.slots.acquire ()
+        self.pool.submit (self.send, self.batch)
+        self.batch = []
+        self.batch_size_bytes = 0
+
+    def send (self, batch):
+        try:
+            boundary = os.urandom (16).hex ()
+            body = self.multipart (batch, boundary)
+            self.post (body, f'multipart/mixed; boundary={boundary}')
+            with self.lock:
+                self.documents += len (batch)
+                self.bytes += sum (len (data) for uri, metadata, data in batch)
+                self.batches += 1
+        except Exception as e:
+            if self.error is None:  self.error = e
+        finally:
+            self.slots.release ()
+
+    # a metadata part then a content part for each document
+    @staticmethod
+    def multipart (batch, boundary):
+        parts = []
+        for uri, metadata, data in batch:
+            parts.append (f'--{boundary}\r\nContent-Type: application/json\r\n'
+                          f'Content-Disposition: attachment; filename="{uri}"; category=metadata\r\n\r\n'.encode ('utf-8'))
+            parts.append (json.dumps (metadata).encode ('utf-8'))
+            content_type = mimetypes.guess_type (uri)[0] or 'application/octet-stream'
+            parts.append (f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+                          f'Content-Disposition: attachment; filename="{uri}"\r\n\r\n'.encode ('utf-8'))
+            parts.append (data)
+            parts.append (b'\r\n')
+        parts.append (f'--{boundary}--\r\n'.encode ('utf-8'))
+        return b''.join (parts)
+
+    def connection (self):
+        connection = getattr (self.local, 'connection', None)
+        if connection is None:
+            if self.scheme == 'https':
+                connection = http.client.HTTPSConnection (self.netloc, timeout=300)
+            else:
+                connection = http.client.HTTPConnection (self.netloc, timeout=300)
+            self.local.connection = connection
+            self.local.challenge = None
+            self.local.nonce_count = 0
+            with self.lock:
+                self.connections.append (connection)
+        return connection
+
+    def post (self, body, content_type):
+        target = f'{self.base_path}/v1/documents'
+        if self.database:  target += '?' + urllib.parse.urlencode ({'database': self.database})
+        # once more for a digest challenge or a keep-alive connection the server dropped
+        for attempt in range (3):
+            connection = self.connection ()
+            headers = {'Content-Type': content_type, 'Accept': 'application/json'}
+            authorization = self.authorization ('POST', target)
+            if authorization:  headers['Authorization'] = authorization
+            try:
+                connection.request ('POST', target, body, headers)
+                response = connection.getresponse ()
+                text = response.read ()
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.CannotSendRequest, http.client.BadStatusLine):
+                connection.close ()
+                if attempt == 2:  raise
+                continue
+            if response.status == 401 and self.auth == 'digest' and attempt < 2:
+                self.local.challenge = self.parse_challenge (response.getheader ('WWW-Authenticate', ''))
+                self.local.nonce_count = 0
+                if self.local.challenge is not None:  continue
+            if response.status >= 300:
+                raise RuntimeError (f'loading a batch failed:  {response.status} {response.reason}:  {text[:500].decode ("utf-8", "replace")}')
+            return
+
+    @staticmethod
+    def parse_challenge (header):
+        scheme, _, rest = header.partition (' ')
+        if scheme.lower () != 'digest':  return None
+        return {key.lower (): quoted if quoted else plain for key, quoted, plain in re.findall (r'(\w+)=(?:"([^"]*)"|([^,\s]*))', rest)}
+
+    def authorization (self, method, target):
+        if self.user is None:  return None
+        if self.auth == 'basic':
+            return 'Basic ' + base64.b64encode (f'{self.user}:{self.password}'.encode ('utf-8')).decode ('ascii')
+        challenge = self.local.challenge
+        if challenge is None:  return None
+        md5 = lambda text: hashlib.md5 (text.encode ('utf-8')).hexdigest ()
+        ha1 = md5 (f'{self.user}:{challenge.get ("realm", "")}:{self.password}')
+        ha2 = md5 (f'{method}:{target}')
+        nonce = challenge.get ('nonce', '')
+        header = f'Digest username="{self.user}", realm="{challenge.get ("realm", "")}", nonce="{nonce}", uri="{target}"'
+        if 'auth' in challenge.get ('qop', '').split (','):
+            self.local.nonce_count += 1
+            nc = f'{self.local.nonce_count:08x}'
+            cnonce = os.urandom (8).hex ()
+            header += f', qop=auth, nc={nc}, cnonce="{cnonce}", response="{md5 (f"{ha1}:{nonce}:{nc}:{cnonce}:auth:{ha2}")}"'
+        else:
+            header += f', response="{md5 (f"{ha1}:{nonce}:{ha2}")}"'
+        if 'opaque' in challenge:  header += f', opaque="{challenge["opaque"]}"'
+        if 'algorithm' in challenge:  header += f', algorithm={challenge["algorithm"]}'
+        return header
+
+    # send what is left and wait for all the batches
+    def close (self):
+        if self.pool is None:  return
+        self.submit ()
+        self.pool.shutdown (wait=True)
+        self.pool = None
+        for connection in self.connections:
+            connection.close ()
+        if self.error:  raise self.error
+
+
+# forest, transaction participant, host and app server fields pulled out of the status xml as it is
+# scanned, as rows for sqlite tables, so checks like the stuck transactions one in dumparse.xml can be
+# run locally;  ids are text, they can be more than sqlite's signed 64 bits
+class DumpMetrics:
+    tables = {
+        'forests': ('forest_id', 'forest_name', 'host_id', 'hostname', 'group_name', 'state', 'current_master_forest', 'line'),
+        'transaction_participants': ('forest_id', 'transaction_id', 'coordinator_id', 'min_commit_timestamp'),
+        'hosts': ('host_id', 'host_name', 'group_id', 'group_name', 'line'),
+        'app_servers': ('server_id', 'server_name', 'group_name', 'host', 'host_id', 'threads', 'max_threads', 'queue_size', 'line'),
+        # every other number:  source is the root element, name the forest, host or app server
+        'metric_values': ('source', 'name', 'element', 'value'),
+    }
+    integer_columns = ('line', 'min_commit_timestamp', 'threads', 'max_threads', 'queue_size')
+
+    def __init__(self):
+        self.rows = {table: [] for table in self.tables}
+
+    # a collector for the xml files of this context, None if there is nothing to pick up in them
+    def collector (self, context, group_mapping):
+        if context.get_top_context () not in ('forest-status', 'host-status'):  return None
+        return MetricsCollector (self, context, group_mapping)
+
+    def add (self, table, values, line=None):
+        row = []
+        for column in self.tables[table]:
+            value = line if column == 'line' else values.get (column.replace ('_', '-'))
+            if value is not None and column in self.integer_columns:  value = self.integer (value)
+            row.append (value)
+        self.rows[table].append (tuple (row))
+
+    # None for an empty or odd value, like <threads/>, rather than stopping the parse
+    @staticmethod
+    def integer (value):
+        try:
+            return int (value)
+        except ValueError:
+            return None
+
+    def add_numbers (self, source, name, numbers):
+        for element, value in numbers:
+            self.rows['metric_values'].append ((source, name, element, float (value)))
+
+    def add_app_server (self, context, lines, line):
+        values = {}
+        numbers = []
+        for text in lines:
+            m = simple_element_pattern.match (text)
+            if m:
+                values.setdefault (m.group (1), m.group (2))
+                if not m.group (1).endswith ('id') and number_pattern.fullmatch (m.group (2)):  numbers.append ((m.group (1), m.group (2)))
+        values['group-name'] = context.get_property ('group')
+        values['host'] = context.get_property ('host')
+        self.add ('app_servers', values, line)
+        self.add_numbers ('server-status', context.get_property ('appserver'), numbers)
+
+    def merge (self, other):
+        for table, rows in other.rows.items ():
+            self.rows[table].extend (rows)
+
+    def connect (self, path=':memory:'):
+        if sqlite3 is None:  raise RuntimeError ('sqlite3 is needed for -metrics and -checks')
+        db = sqlite3.connect (path)
+        for table, columns in self.tables.items ():
+            db.execute (f'drop table if exists {table}')
+            db.execute (f'create table {table} ({", ".join (columns)})')
+            db.executemany (f'insert into {table} values ({", ".join ("?" * len (columns))})', self.rows[table])
+        db.execute ('create index if not exists participants_coordinator on transaction_participants (coordinator_id)')
+        db.execute ('create index if not exists forests_id on forests (forest_id)')
+        db.commit ()
+        return db
+
+    # the 'stuck transactions' query of dumparse.xml:  a forest coordinating transactions that isn't open
+    @staticmethod
+    def stuck_transactions (db):
+        count = db.execute ('select count (*) from forests').fetchone ()[0]
+        if count < 2:
+            return [f'Total of {count} forest-status results found; check not run.']
+        report = []
+        problems = db.execute ("select forest_id, forest_name, current_master_forest from forests where state != 'open' "
+                               "and forest_id in (select coordinator_id from transaction_participants)").fetchall ()
+        for forest_id, forest_name, master in problems:
+            acting = db.execute ('select forest_name from forests where forest_id = ?', (master,)).fetchone ()
+            report.append (f'Consider flipping {acting[0] if acting else master} to {forest_name} to clear stuck transaction.')
+            report.append ('')
+            report.append ('Transaction timestamps affected: ')
+            for (timestamp,) in db.execute ('select min_commit_timestamp from transaction_participants where coordinator_id = ? order by 1', (forest_id,)):
+                # 100 nanosecond ticks since 1970, as xdmp:timestamp-to-wallclock takes them
+                report.append (datetime.datetime.fromtimestamp (timestamp / 1e7, datetime.timezone.utc).isoformat ())
+        return report if report else ['Check run, no problem found.']
+
+    # the 'app server threads/queue' query of dumparse.xml, busiest first
+    @staticmethod
+    def app_server_threads (db):
+        return [f'{group}/{host}/{name}:  threads {threads}/{max_threads}, queue {queue}'
+                for group, host, name, threads, max_threads, queue in db.execute (
+                    'select group_name, host, server_name, threads, max_threads, queue_size from app_servers '
+                    'order by queue_size desc, threads desc')]
+
+
+# picks up one block's forest-status, forest-counts or host-status values line by line, for DumpMetrics
+class MetricsCollector:
+    __slots__ = ('metrics', 'context', 'group_mapping', 'values', 'numbers', 'participant')
+
+    def __init__(self, metrics, context, group_mapping):
+        self.metrics = metrics
+        self.context = context
+        self.group_mapping = group_mapping
+        self.reset ()
+
+    def reset (self):
+        self.values = {}
+        self.numbers = []
+        self.participant = None
+
+    def line (self, text):
+        m = simple_element_pattern.match (text)
+        if m is None:
+            if '<transaction-participant>' in text:
+                self.participant = {}
+            elif '</transaction-participant>' in text and self.participant is not None:
+                self.participant['forest-id'] = self.values.get ('forest-id')
+                self.metrics.add ('transaction_participants', self.participant)
+                self.participant = None
+            return
+        name, value = m.group (1), m.group (2)
+        if self.participant is not None:
+            self.participant[name] = value
+            return
+        self.values.setdefault (name, value)
+        if not name.endswith ('id') and number_pattern.fullmatch (value):  self.numbers.append ((name, value))
+
+    # the end of an xml file in the block
+    def end (self, element_name, line):
+        context = self.context
+        if element_name == 'forest-status':
+            self.values['hostname'] = context.find_property ('hostname')
+            self.values['group-name'] = self.group_mapping.get (self.values['hostname'], 'UnknownGroup')
+            self.metrics.add ('forests', self.values, line)
+            self.metrics.add_numbers (element_name, self.values.get ('forest-name'), self.numbers)
+        elif element_name == 'host-status':
+            self.values['group-name'] = self.group_mapping.get (context.find_property ('host'), 'UnknownGroup')
+            self.metrics.add ('hosts', self.values, line)
+            self.metrics.add_numbers (element_name, self.values.get ('host-name'), self.numbers)
+        else:
+            self.metrics.add_numbers (element_name, context.find_property ('forest-name') or context.find_property ('host'), self.numbers)
+        self.reset ()
+
+
+# a sparse time index of the log files written:  each log is cut into chunks of at most lines_per_chunk
+# lines, or a minute of log time, always starting at a timestamped line, and each chunk is kept as
+# [offset in the output file, line, earliest time, latest time];  the times are the log's own text,
+# which sorts the same as the time it stands for
+class DumpLogIndex:
+    name = 'Logs-Time-Index.jsonl'
+
+    def __init__(self, lines_per_chunk=1000):
+        self.lines_per_chunk = lines_per_chunk
+        self.files = []
+        # bytes written so far to each log, for the offsets when a log is appended to
+        self.sizes = {}
+
+    def add (self, path, context, lines):
+        offset = self.sizes.get (path, 0)
+        chunks = []
+        chunk = None
+        for line_number, line in enumerate (lines):
+            m = log_time_pattern.match (line)
+            if m:
+                time = m.group (0)
+                if chunk is None or line_number - chunk[1] >= self.lines_per_chunk or time[:16] > chunk[2][:16]:
+                    chunk = [offset, line_number, time, time]
+                    chunks.append (chunk)
+                elif time < chunk[2]:  chunk[2] = time
+                elif time > chunk[3]:  chunk[3] = time
+            offset += len (line.encode ('utf-8')) + 1
+        self.sizes[path] = offset
+        self.files.append ({'path': path, 'group': context.find_property ('group'), 'host': context.find_property ('host'),
+                            'size': offset, 'chunks': chunks})
+
+    def merge (self, other):
+        self.files.extend (other.files)
+
+    def write (self, out_dir):
+        os.makedirs (out_dir, 0o777, True)
+        with open (os.path.join (out_dir, self.name), 'w', encoding='utf-8') as f:
+            for entry in self.files:
+                f.write (json.dumps (entry) + '\n')
+
+    # the entries of the index in out_dir, None if there is none
+    @classmethod
+    def read (cls, out_dir):
+        path = os.path.join (out_dir, cls.name)
+        if not os.path.exists (path):  return None
+        with open (path, encoding='utf-8') as f:
+            return [json.loads (line) for line in f]
+
+    # (time, label, lines) for each entry of one log from start to end, lines without a time going with
+    # the entry before them;  only the entries from first to last (inclusive, to its precision) if given
+    @staticmethod
+    def entries (path, label, ranges, first=None, last=None):
+        with open (path, 'rb') as f:
+            for start, end in ranges:
+                f.seek (start)
+                offset = start
+                time, lines = '', []
+                while offset < end:
+                    data = f.readline ()
+                    if not data:  break
+                    offset += len (data)
+                    line = data.decode ('utf-8').rstrip ('\n')
+                    m = log_time_pattern.match (line)
+                    if m:
+                        if lines and DumpLogIndex.within (time, first, last):  yield (time, label, lines)
+                        time, lines = m.group (0), []
+                    lines.append (line)
+                if lines and DumpLogIndex.within (time, first, last):  yield (time, label, lines)
+
+    @staticmethod
+    def within (time, first, last):
+        if first is not None and time < first:  return False
+        if last is not None and time[:len (last)] > last:  return False
+        return True
+
+    # byte ranges of a log that can have entries from first to last, with neighbouring chunks run together
+    @staticmethod
+    def ranges (entry, first=None, last=None):
+        ranges = []
+        chunks = entry['chunks']
+        for i, (offset, line, earliest, latest) in enumerate (chunks):
+            end = chunks[i + 1][0] if i + 1 < len (chunks) else entry['size']
+            # lines before the first timestamp only come with the whole log
+            if i == 0 and offset > 0 and first is None and last is None:  offset = 0
+            if not DumpLogIndex.within (latest, first, None) or not DumpLogIndex.within (earliest, None, last):  continue
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1][1] = end
+            else:
+                ranges.append ([offset, end])
+        if not chunks and first is None and last is None:  ranges.append ([0, entry['size']])
+        return ranges
+
+    # all the logs' entries from first to last merged into one timeline, each log read only where its
+    # chunks say it can have them;  each log is taken in its own order, which is time order but for clock changes
+    @classmethod
+    def timeline (cls, out_dir, entries, first=None, last=None):
+        logs = []
+        for entry in entries:
+            path = os.path.join (out_dir, entry['path'])
+            if not os.path.exists (path):  continue
+            label = f'{entry["host"]} {os.path.basename (entry["path"])}'
+            logs.append (cls.entries (path, label, cls.ranges (entry, first, last), first, last))
+        for time, label, lines in heapq.merge (*logs, key=lambda entry: entry[0]):
+            for line in lines:
+                yield f'{label}: {line}\n'
+
+
+# timings and counts for -stats:  phases, blocks by type and subtype, what was written per context,
+# and the slowest blocks; plain data so a worker process can send its stats back to be merged
+class DumpStats:
+    slowest_count = 20
+
+    def __init__(self):
+        self.phases = []
+        # type -> subtype -> count
+        self.blocks = {}
+        # classify, ready and write time summed over the blocks
+        self.stages = {}
+        # top context -> {'files': set of paths, 'bytes': n, 'writes': n}
+        self.written = {}
+        # min heap of (seconds, start line, type, subtype, context)
+        self.slowest = []
+        self.workers = []
+
+    @staticmethod
+    def peak_rss (who=None):
+        if resource is None:  return None
+        usage = resource.getrusage (resource.RUSAGE_SELF if who is None else who)
+        # kilobytes on linux, bytes on macOS
+        return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+    @contextlib.contextmanager
+    def phase (self, name):
+        wall, cpu = time.perf_counter (), time.process_time ()
+        try:
+            yield
+        finally:
+            self.phases.append ({'phase': name, 'wall': time.perf_counter () - wall, 'cpu': time.process_time () - cpu, 'peak-rss': self.peak_rss ()})
+
+    def time_block (self, stage, block, seconds):
+        self.stages[stage] = self.stages.get (stage, 0.0) + seconds
+        block.seconds += seconds
+
+    # a block that is done with, counted once
+    def add_block (self, block):
+        subtype = block.context.get_property ('subtype') or ''
+        types = self.blocks.setdefault (block.type, {})
+        types[subtype] = types.get (subtype, 0) + 1
+        entry = (block.seconds, block.start_line, block.type, subtype, block.context.get_top_context ())
+        if len (self.slowest) < self.slowest_count:
+            heapq.heappush (self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace (self.slowest, entry)
+
+    def wrote (self, block, path, pieces):
+        written = self.written.setdefault (block.context.get_top_context (), {'files': set (), 'bytes': 0, 'writes': 0})
+        written['files'].add (path)
+        written['writes'] += 1
+        for piece in pieces:
+            written['bytes'] += piece[2] - piece[1] if isinstance (piece, tuple) else len (piece)
+
+    # stats from a worker process
+    def merge (self, other, name):
+        self.workers.append ({'worker': name, 'phases': other.phases})
+        for type, subtypes in other.blocks.items ():
+            types = self.blocks.setdefault (type, {})
+            for subtype, count in subtypes.items ():
+                types[subtype] = types.get (subtype, 0) + count
+        for stage, seconds in other.stages.items ():
+            self.stages[stage] = self.stages.get (stage, 0.0) + seconds
+        for context, counts in other.written.items ():
+            written = self.written.setdefault (context, {'files': set (), 'bytes': 0, 'writes': 0})
+            written['files'] |= counts['files']
+            written['bytes'] += counts['bytes']
+            written['writes'] += counts['writes']
+        self.slowest = heapq.nlargest (self.slowest_count, self.slowest + other.slowest)
+        heapq.heapify (self.slowest)
+
+    def report (self):
+        report = {
+            'phases': self.phases,
+            'peak-rss': self.peak_rss (),
+            'blocks': self.blocks,
+            'block-count': sum (sum (subtypes.values ()) for subtypes in self.blocks.values ()),
+            'stages': self.stages,
+            'written': {context: {'files': len (counts['files']), 'bytes': counts['bytes'], 'writes': counts['writes']}
+                        for context, counts in sorted (self.written.items ())},
+            'slowest-blocks': [{'seconds': seconds, 'line': line, 'type': type, 'subtype': subtype, 'context': context}
+                               for seconds, line, type, subtype, context in sorted (self.slowest, reverse=True)],
+        }
+        if self.workers:
+            report['workers'] = self.workers
+            report['peak-rss-workers'] = self.peak_rss (resource.RUSAGE_CHILDREN) if resource is not None else None
+        return report
+
+    def write_report (self, path):
+        write_json (self.report (), path)
+
+
+# a -stats report to a file, or stdout for '-'
+def write_json (report, path):
+    if path == '-':
+        json.dump (report, sys.stdout, indent=1)
+        print ()
+        return
+    if os.path.dirname (path):  os.makedirs (os.path.dirname (path), exist_ok=True)
+    with open (path, 'w') as f:
+        json.dump (report, f, indent=1)
+
+# where -stats goes:  the file given, stdout for '-', or parse-stats.json in the output directory, since
+# stdout has other things on it
+def stats_path (args):
+    if args.stats is True:  return os.path.join (args.out_dir, 'parse-stats.json')
+    return args.stats
+
+
+# sidecar index of a dump:  a json line for the dump (size, mtime, out-dir), then one for each write
+# write_files would do, with the byte ranges it copies and the context it was found in, so files
+# can be pulled out of the dump later without parsing it again
+class DumpIndex:
+    version = 2
+    properties = ('group', 'host', 'forest-name', 'database', 'appserver')
+
+    def __init__(self, dump_path, path=None, filter=None):
+        self.path = dump_path + '.index' if path is None else path
+        # written aside and moved into place by close, so a run that dies leaves no partial index to trust
+        self.file = open (self.path + '.tmp', 'w', encoding='utf-8')
+        self.out_dir = None
+        self.dump_path = dump_path
+        # a filtered index only has some of the files, so it is only good for the same filter
+        self.filter = DumpFilter.settings (filter)
+
+    def write_info (self, out_dir):
+        self.out_dir = out_dir
+        info = self.dump_info (self.dump_path)
+        info.update ({'version': self.version, 'out-dir': out_dir, 'filter': self.filter})
+        self.file.write (json.dumps (info) + '\n')
+
+    @staticmethod
+    def dump_info (dump_path):
+        stat = os.stat (dump_path)
+        return {'dump': os.path.basename (dump_path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def add (self, block, path, mode, header, limits):
+        out_dir = block.context.find_property ('out-dir')
+        if self.out_dir is None:  self.write_info (out_dir)
+        entry = {
+            'path': os.path.relpath (path, out_dir),
+            'mode': mode,
+            'header': header,
+            'ranges': block.text.runs (limits[0], limits[1]),
+            'line': block.start_line + limits[0],
+            'context': block.context.get_top_context (),
+        }
+        # the host and group in the path, if any, not the report host the dump frame has
+        host, group = DumpFilter.host_group (block.context)
+        resolved = {'host': host, 'group': group}
+        for key in self.properties:
+            value = resolved[key] if key in resolved else block.context.find_property (key)
+            if value is not None:  entry[key] = value
+        self.file.write (json.dumps (entry) + '\n')
+
+    def close (self):
+        # nothing to write, still a good index
+        if self.out_dir is None:  self.write_info (None)
+        self.file.close ()
+        os.replace (self.path + '.tmp', self.path)
+
+    # (dump info, entries whose path matches one of the globs) from an index, None if it is missing, stale
+    # or made with another filter
+    @classmethod
+    def read (cls, dump_path, patterns, path=None, filter=None):
+        if path is None:  path = dump_path + '.index'
+        if not os.path.exists (path):  return None
+        with open (path, encoding='utf-8') as f:
+            first = f.readline ()
+            info = json.loads (first) if first else {}
+            stamp = cls.dump_info (dump_path)
+            if info.get ('version') != cls.version or info.get ('size') != stamp['size'] or info.get ('mtime') != stamp['mtime']:
+                return None
+            if info.get ('filter') != DumpFilter.settings (filter):  return None
+            entries = []
+            for line in f:
+                entry = json.loads (line)
+                if any (fnmatch.fnmatchcase (entry['path'], pattern) for pattern in patterns):
+                    entries.append (entry)
+        return info, entries
+
+
+# the pieces for an index entry, the same write_block made for it
+def index_pieces (source, entry):
+    pieces = [(entry['header'] + '\n').encode ('utf-8')] if entry['header'] else []
+    for start, end, clean in entry['ranges']:
+        if clean:
+            pieces.append ((source, start, end))
+            continue
+        raw = source.text (start, end).split ('\n')
+        # the newline ending the last line, not another line
+        if raw[-1] == '':  raw.pop ()
+        pieces.append (''.join (line.strip () + '\n' for line in raw).encode ('utf-8'))
+    return pieces
+
+
+# which output files to make:  each filter is a list of globs, None for all;  files with no host (cluster
+# sections), no forest or no database aren't held to those filters
+class DumpFilter:
+    def __init__(self, sections=None, hosts=None, groups=None, forests=None, databases=None, paths=None):
+        self.sections = sections
+        self.hosts = hosts
+        self.groups = groups
+        self.forests = forests
+        self.databases = databases
+        # relative to the out-dir, like 'Group-0/*/Logs/ErrorLog.txt'
+        self.paths = paths
+
+    @staticmethod
+    def matches (patterns, value):
+        if patterns is None or value is None:  return True
+        return any (fnmatch.fnmatchcase (value, pattern) for pattern in patterns)
+
+    # the host and group a file is under:  the app server's, the forest's, or the host section's
+    @staticmethod
+    def host_group (context):
+        if context.at_top_context ('app-servers'):
+            return context.get_property ('host'), context.get_property ('group')
+        if context.has_property ('hostname'):
+            return context.get_property ('hostname'), context.get_property ('group')
+        if 'host' in context.path:
+            return context.find_property ('host'), context.find_property ('group')
+        return None, None
+
+    # whether files in this context can be kept, from what is known of it so far
+    def keeps_context (self, context):
+        if not self.matches (self.sections, context.get_top_context ()):  return False
+        host, group = self.host_group (context)
+        return (self.matches (self.hosts, host) and self.matches (self.groups, group)
+                and self.matches (self.forests, context.get_property ('forest-name'))
+                and self.matches (self.databases, context.find_property ('database')))
+
+    def keeps_path (self, path):
+        return self.matches (self.paths, path)
+
+    # the globs, as an index header keeps them;  None for no filter
+    @staticmethod
+    def settings (filter):
+        if filter is None:  return None
+        return {name: getattr (filter, name) for name in ('sections', 'hosts', 'groups', 'forests', 'databases', 'paths')}
+
+
 class DumpFile:
 
     def __init__(self, text, type):
@@ -122,42 +1743,289 @@ class DumpFile:
         
 class DumpBlocks:
 
+    # stripped separator lines and the types of the blocks they start
+    separator_types = {
+        '===========================================================================': 'subsep',
+        '###########################################################################': 'sep',
+        '%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%': 'bigsep',
+    }
+    # bytes of the dump read at a time, and how many chunks -pipeline reads ahead
+    chunk_size = 1 << 20
+    pipeline_depth = 8
+
     def __init__(self):
         self.blocks = []
         self.hostname_group_mapping = {}
         self.host_id_hostname_mapping = {}
+        # block number of self.blocks[0], moves up as streaming frees blocks
+        self.first_block = 0
+        # next block for the context run through, and the context it carries forward
+        self.next_block = 0
+        self.last_context = None
+        self.saw_database_topology = False
+        self.streaming = False
+        self.debug = False
+        # where the files go, the dump context's out-dir
+        self.out_dir = './Support-Dump'
+        # a DumpSource when blocks keep offsets instead of lines
+        self.source = None
+        self.writer = DumpWriter ()
+        # a DumpStats for -stats
+        self.stats = None
+        # a DumpIndex to put writes in instead of doing them, for -index
+        self.index = None
+        # a DumpLogIndex of the logs written, for -log-index
+        self.log_index = None
+        # a DumpMetrics to pick up forest, host and app server fields into, for -metrics
+        self.metrics = None
+        # a DumpJournal to skip what an earlier run already wrote, for -resume
+        self.journal = None
+        # a DumpRecords to hand the files to instead of the writer, for iter_files
+        self.records = None
+        # a DumpFilter for the files to make, and whether the text block being read is one it drops
+        self.filter = None
+        self.dropping = False
+        # chunks read ahead of the parsing on a thread of their own, for -pipeline
+        self.read_ahead = 0
+        # bytes of dump text read, after decompressing, for the MB/s of -batch
+        self.bytes_read = 0
 
     
-    def add_line (self, line, line_number):
-        if line == '===========================================================================' or line == ' =================================================================':
-            self.blocks.append (DumpBlock('subsep'))
-            self.blocks[-1].start_line = line_number
-        elif line == '###########################################################################' or line == ' ###########################################################################':
-            self.blocks.append (DumpBlock('sep'))
-            self.blocks[-1].start_line = line_number
-        elif line == '%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%' or line == ' %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%':
-            self.blocks.append (DumpBlock('bigsep'))
-            self.blocks[-1].start_line = line_number
-        else:
-            if len (self.blocks) < 1 or self.blocks[-1].type != 'text':
-                if len (line) == 0:  return
-                self.blocks.append (DumpBlock ('text'))
-                self.blocks[-1].start_line = line_number
-            
-        self.blocks[-1].add_line (line)
+    # lines first up to last of a chunk, with no separators in them;  blank (i) says if line i strips to
+    # nothing, extend (i, j) adds lines i up to j to the last block
+    def add_run (self, line_number, first, last, blank, extend):
+        if first >= last:  return
+        if len (self.blocks) < 1 or self.blocks[-1].type != 'text':
+            # blank lines after a separator don't start a block
+            while first < last and blank (first):  first += 1
+            if first == last:  return
+            self.new_block ('text', line_number + first + 1)
+            extend (first, first + 1)
+            if self.filter is not None and self.streaming:  self.dropping = self.drops_block (self.len () - 1)
+            first += 1
+        if not self.dropping:  extend (first, last)
+
+    # a decoded chunk of whole lines:  the separators are found in it with one regex, the lines between
+    # them go into their blocks all at once;  returns the line number of its last line
+    def add_chunk (self, text, line_number):
+        lines = text.split ('\n')
+        if text.endswith ('\n'):  lines.pop ()
+        lines = list (map (str.strip, lines))
+        blank = lambda i: len (lines[i]) == 0
+        extend = lambda i, j: self.blocks[-1].text.extend (lines[i:j])
+        first = separator = position = 0
+        for offset, char in find_separators (text):
+            separator += text.count ('\n', position, offset)
+            position = offset
+            self.add_run (line_number, first, separator, blank, extend)
+            self.new_block (separator_block_types[char], line_number + separator + 1)
+            first = separator + 1
+        self.add_run (line_number, first, len (lines), blank, extend)
+        return line_number + len (lines)
+
+    # the same for the chunk from offset start to end of the memory mapped source, where only the line
+    # offsets are kept;  which lines strip() would change is worked out on the whole chunk, nothing is decoded
+    def add_source_chunk (self, start, end, line_number):
+        data = self.source.map[start:end]
+        lines = data.split (b'\n')
+        if data.endswith (b'\n'):  lines.pop ()
+        count = len (lines)
+        starts = array.array ('Q', itertools.accumulate (map ((1).__add__, map (len, lines)), initial=start))
+        starts[count] = end
+        clean = bytearray (map (operator.eq, lines, map (bytes.strip, lines)))
+        # the other unicode whitespace, when the chunk has any of it
+        if any (data.find (lead) >= 0 for lead in unicode_space_leads):
+            ends = [m.start () for m in line_end_space_pattern.finditer (data)]
+            ends += [m.start () + 1 for m in line_start_space_pattern.finditer (data)]
+            if unicode_space_pattern.match (data):  ends.append (0)
+            for offset in ends:
+                clean[bisect.bisect_right (starts, start + offset, 0, count) - 1] = 0
+        if not data.endswith (b'\n'):  clean[count - 1] = 0
+        blank = lambda i: len (self.source.text (starts[i], starts[i + 1]).strip ()) == 0
+        extend = lambda i, j: self.blocks[-1].text.extend (starts[i:j], clean[i:j], starts[j])
+        first = 0
+        for offset, char in find_separators (data):
+            separator = bisect.bisect_left (starts, start + offset, first, count)
+            self.add_run (line_number, first, separator, blank, extend)
+            self.new_block (separator_block_types[char], line_number + separator + 1)
+            first = separator + 1
+        self.add_run (line_number, first, count, blank, extend)
+        return line_number + count
+
+    # streaming with a filter, a text block that would be skipped only keeps its first line;  known once
+    # the separator before it is the next to classify and can't start a rule that takes it
+    def drops_block (self, block_number):
+        if self.next_block != block_number - 1 or block_number - 1 < self.first_block:  return False
+        if self.filter.keeps_context (self.last_context):  return False
+        block, next_block = self.block (block_number - 1), self.block (block_number)
+        if self.rule_index is None:  self.index_rules ()
+        keys = self.line_keys (next_block.first_line())
+        tops = (self.last_context.get_top_context(), None)
+        for sequence, rules in self.rule_index.items ():
+            if sequence[0:2] != (block.type, next_block.type):  continue
+            for top, key in rules:
+                if top in tops and key in keys:  return False
+        return True
+
+    def new_block (self, type, line_number):
+        self.dropping = False
+        self.blocks.append (DumpBlock (type))
+        self.blocks[-1].start_line = line_number
+        if self.source is not None and type == 'text':
+            self.blocks[-1].text = DumpLines (self.source)
+        # a new block completes the one before it, so the lookahead may have moved far enough
+        if self.streaming:  self.stream_blocks ()
 
     def block (self, block_number):
-        return self.blocks[block_number]
+        return self.blocks[block_number - self.first_block]
 
     def len (self):
-        return len (self.blocks) #self.blocks.size()
+        return self.first_block + len (self.blocks) #self.blocks.size()
 
     def dump(self):
-        i = 0;
+        i = self.first_block;
         for block in self.blocks:
             block.dump(i)
             i += 1
 
+    # read the dump, or the lines from byte offset start up to end, and write out its files
+    def parse (self, path, use_mmap=False, stream=False, start=0, end=None, line_number=0, context=None):
+        if stream:  self.start_stream (context)
+        # streaming does it all as it reads
+        with self.phase ('stream' if stream else 'read'):
+            self.read (path, use_mmap, start, end, line_number)
+            if stream:  self.finish_stream ()
+
+        if not stream:
+            with self.phase ('classify'):
+                self.context_run_through (context)
+            with self.phase ('ready'):
+                self.ready_files ()
+            with self.phase ('write'):
+                self.write_files ()
+            if self.debug:  self.dump ()
+        if self.source is not None:
+            self.source.close ()
+            self.source = None
+
+    # put the dump, or the lines from byte offset start up to end, into blocks a chunk at a time
+    def read (self, path, use_mmap=False, start=0, end=None, line_number=0):
+        if use_mmap:
+            self.source = DumpSource (path)
+            for chunk_start, chunk_end in self.source.chunks (start, end, self.chunk_size, self.read_ahead):
+                line_number = self.add_source_chunk (chunk_start, chunk_end, line_number)
+            self.bytes_read += (len (self.source.map) if end is None else end) - start
+        elif start == 0 and end is None:
+            # the whole dump reads like a text file
+            with open_dump (path) as dumpfile, self.chunk_reader (map (text_chunk, read_chunks (dumpfile, size=self.chunk_size))) as chunks:
+                for chunk in chunks:
+                    line_number = self.add_chunk (chunk, line_number)
+                self.bytes_read += dumpfile.tell ()
+        else:
+            with open (path, 'rb') as f:
+                f.seek (start)
+                with self.chunk_reader (map (functools.partial (bytes.decode, encoding='utf-8'),
+                                             read_chunks (f, None if end is None else end - start, self.chunk_size))) as chunks:
+                    for chunk in chunks:
+                        line_number = self.add_chunk (chunk, line_number)
+                self.bytes_read += f.tell () - start
+        return line_number
+
+    # the chunks, read on a thread of their own with -pipeline
+    def chunk_reader (self, chunks):
+        if self.read_ahead == 0:  return contextlib.nullcontext (chunks)
+        return contextlib.closing (read_ahead (chunks, self.read_ahead))
+
+    # host sections (bigsep, 'Hostname: ...' text, bigsep) only need the mappings from the
+    # cluster part of the dump; returns (start offset, end of the first line, lines before it) for each;
+    # the separators are found a chunk at a time, only the first line of each text block is looked at
+    @staticmethod
+    def index_host_sections (path):
+        sections = []
+        if os.path.getsize (path) == 0:  return sections
+        # 'bigsep' just after a bigsep, 'hostname' in a 'Hostname:' text block right after one
+        state = None
+        candidate = None
+        block_count = 0
+        # where the last separator line ended, and the lines before the last separator looked at
+        last_end = 0
+        line_number = 0
+        source = DumpSource (path)
+        try:
+            for start, end in source.chunks (0, None, DumpBlocks.chunk_size):
+                chunk = source.map[start:end]
+                position = 0
+                for offset, char in find_separators (chunk):
+                    line_number += chunk.count (b'\n', position, offset)
+                    position = offset
+                    line_end = chunk.find (b'\n', offset)
+                    line_end = end if line_end < 0 else start + line_end + 1
+                    # the text block since the last separator, if there is one
+                    line = first_text_line (source.map, last_end, start + offset)
+                    if line is not None:
+                        block_count += 1
+                        state = 'hostname' if state == 'bigsep' and line.startswith ('Hostname:') else None
+                    type = separator_block_types[char]
+                    if type == 'bigsep' and state == 'hostname':
+                        sections.append (candidate)
+                    # the first block is the dump info, never a host
+                    if type == 'bigsep' and block_count > 0:
+                        state = 'bigsep'
+                        candidate = (start + offset, line_end, line_number)
+                    else:
+                        state = None
+                    block_count += 1
+                    last_end = line_end
+                line_number += chunk.count (b'\n', position)
+        finally:
+            source.close ()
+        return sections
+
+    # streaming mode:  classify, ready and write each block as soon as its lookahead is in,
+    # then free it, so only a few blocks are ever held
+    def start_stream (self, context=None):
+        self.streaming = True
+        self.start_context (context)
+        self.saw_database_topology = False
+
+    def stream_blocks (self, at_end=False):
+        # classification looks at most 2 blocks ahead (3 block sequences), and needs the next block complete
+        while self.next_block < self.len () and (at_end or self.next_block + 2 < self.len ()):
+            block_number = self.next_block
+            self.timed ('classify', self.block (block_number), self.classify_block)
+            # those blocks are final now
+            for i in range (block_number, self.next_block):
+                block = self.block (i)
+                self.timed ('ready', block, self.ready_block, block)
+                self.timed ('write', block, self.write_block, block)
+                if self.stats is not None:  self.stats.add_block (block)
+                if self.debug:  block.dump (i)
+            self.free_blocks (self.next_block)
+
+    def finish_stream (self):
+        self.stream_blocks (True)
+        self.streaming = False
+        self.writer.close ()
+
+    def phase (self, name):
+        if self.stats is None:  return contextlib.nullcontext ()
+        return self.stats.phase (name)
+
+    # function (*args), its time put down to block under -stats
+    def timed (self, stage, block, function, *args):
+        if self.stats is None:  return function (*args)
+        start = time.perf_counter ()
+        result = function (*args)
+        self.stats.time_block (stage, block, time.perf_counter () - start)
+        return result
+
+    # drop all blocks before block_number
+    def free_blocks (self, block_number):
+        count = block_number - self.first_block
+        if count > 0:
+            del self.blocks[0:count]
+            self.first_block = block_number
+
     def get_line_key_values (self, line, properties):
         pairs = line.split (', ')
         for pair in pairs:
@@ -167,19 +2035,6 @@ class DumpBlocks:
     def config_file_subsection (self, line):
         return re.fullmatch (r'(server|groups|databases|assignments|hosts|clusters|keystore|kms|tokenizer|mimetypes)(_[0-9])?\.xml', line)
 
-    # match the type_sequence, starting at the given block number
-    def at_start_of_sequence (self, type_sequence, start_at):
-        type_count = len (type_sequence)
-        if type_count < 1: return False
-        end_at = start_at + type_count - 1
-        if end_at > len (self.blocks) - 1:  return False
-        match = True
-        for i in range (0, type_count - 1):
-            if type_sequence[i] != self.blocks[start_at + i].type:
-                    match = False
-                    break
-        return match
-
     subsection_titles = {
         'Host Status': 'host-status',
         'App Server Status': 'app-servers',
@@ -188,12 +2043,13 @@ class DumpBlocks:
         'Trigger Definitions': 'trigger-definitions',
         'CPF Domains': 'cpf-domains',
         'CPF Pipelines': 'cpf-pipelines',
-        'FlexRep Domains': 'flexrep domains',
-        'SQL Schemas': 'sql schemas',
-        'SQL Views': 'sql views',
-        'XML Schemas': 'xml schemas',
+        'FlexRep Domains': 'flexrep-domains',
+        'SQL Schemas': 'sql-schemas',
+        'SQL Views': 'sql-views',
+        'XML Schemas': 'xml-schemas',
         'Configuration': 'configuration',
         'Log Files': 'log-files',
+        'Data Directory': 'data-directory',
     }
 
     # copies context over and sets the subtype property
@@ -204,226 +2060,376 @@ class DumpBlocks:
     def get_hostname_from_host_info (self, block):
         for line in block.text:
             if line.startswith ('Report Host:'):
-                return re.sub (r'Report Host:\s+', '', line)
+                return report_host_pattern.sub ('', line)
         return 'unknown-hostname-from-host-info'
 
     # deal with sections, return next block and last context
     def set_section (self, block_number, section_name):
         block = self.block(block_number)
         block.context.pop_context()
-        block.context.push_context(section_name.lower().replace (' ', '-'), {})
+        block.context.push_context(self.subsection_titles.get (section_name, section_name.lower().replace (' ', '-')), {})
         # mark heading and skip it
         self.set_next_block_subtype (block_number)
         return block_number+1, block.context
 
 
     # remove notices that a file isn't there (checks for all older versions)
-    def context_run_through (self):
-        block_number = 0
+    def context_run_through (self, context=None):
+        self.start_context (context)
+        while self.next_block < self.len ():
+            self.timed ('classify', self.block (self.next_block), self.classify_block)
+
+    # context is where a host section picks up from the cluster part
+    def start_context (self, context=None):
+        self.next_block = 0
         #context = [{'path': ['dump'], 'properties': []}]
-        last_context = DumpContext ()
-        last_context.push_context ('dump', {'out-dir': './Support-Dump'})
-        while block_number < len (self.blocks):
-            block = self.blocks[block_number]
-            # carry forward the last context to start
-            block.context = DumpContext.copy_context (last_context)
-
-            # means it was considered directly in the context run through
-            block.add_flag ('*')
-
-            # dump info at start of dump
-            if self.at_start_of_sequence (['bigsep', 'text', 'bigsep'], block_number) and block.context.at_top_context ('dump'):
-                block.context.set_property ('host', self.get_hostname_from_host_info (self.blocks[block_number+1]))
-                block.context.push_context ('dump-info', {})
-                # mark heading and skip it
-                self.set_next_block_subtype (block_number, 'file')
-                block_number += 1
-                last_context = block.context
-            # dump dump-info -> dump - cluster - app-servers
-            elif self.at_start_of_sequence (['subsep', 'text', 'subsep'], block_number) and block.context.at_top_context ('dump-info') and self.block(block_number + 1).first_line() == 'App Server Status':
-                block.context.pop_context()
-                # any way to get group name?  set this from the app-server level too?
-                block.context.push_context('cluster', {})
-                block.context.push_context('app-servers', {})
-                # mark heading and skip it
-                self.set_next_block_subtype (block_number)
-                block_number += 1
-                last_context = block.context
-            # app server server-status file
-            elif self.at_start_of_sequence (['subsep', 'text'], block_number) and block.context.at_top_context ('app-servers') and self.block(block_number + 1).first_line().startswith ('Group:'):
-                next_block = self.block(block_number + 1)
-                self.get_line_key_values (next_block.first_line(), block.context.top_properties())
-                hostname = block.context.get_property('host')
-                host_id = self.get_xml_value ('host-id', next_block.text)
-                self.host_id_hostname_mapping[host_id] = hostname
-                block.context.set_property ('host-id', host_id)
-                # save mappings for the later host sections
-                self.hostname_group_mapping[hostname] = block.context.get_property('group')
-                self.set_next_block_subtype (block_number, 'file')
-                # remove line to leave just xml
-                # self.block(block_number + 1).text[0 : 1] = []
-                block_number += 1
-                last_context = block.context
-            # Database Topology - database-dump()
-            elif self.at_start_of_sequence (['subsep', 'text', 'subsep'], block_number) and block.context.at_top_context ('app-servers') and self.block(block_number + 1).first_line() == 'Database Topology':
-                block.context.pop_context()
-                # any way to get cluster name?  set this from the app-server level too?
-                block.context.push_context('database-topology', {})
-                # mark heading and skip it
-                self.set_next_block_subtype (block_number)
-                block_number += 1
-                last_context = block.context
-            # forest-dump
-            elif self.at_start_of_sequence (['subsep', 'text', 'subsep'], block_number) and block.context.at_top_context ('database-topology') and self.block(block_number + 1).first_line() == 'Forest Status':
-                block_number, last_context = self.set_section (block_number, self.block(block_number + 1).first_line()) 
-            # all similar section headings
-            elif self.at_start_of_sequence (['subsep', 'text', 'subsep'], block_number)\
-                    and self.block(block_number + 1).first_line() in ('Trigger Definitions','CPF Domains','CPF Pipelines','FlexRep Domains','SQL Schemas','SQL Views','XML Schemas','Configuration','Log Files','Data Directory'):
-                block_number, last_context = self.set_section (block_number, self.block(block_number + 1).first_line()) 
-            elif self.at_start_of_sequence (['subsep', 'text', 'subsep'], block_number) and self.block(block_number + 1).first_line() == 'Host Status':
-                block.context.push_context('host-status', {})
-                # mark heading and skip it
-                self.set_next_block_subtype (block_number)
-                block_number += 1
-                last_context = block.context
-            # start of new host
-            ## TODO  figure it out, what level to pop to, or restart new context?
-            elif self.at_start_of_sequence (['bigsep', 'text', 'bigsep'], block_number) and self.block(block_number + 1).first_line().startswith ('Hostname:'):
-                block.context.pop_context()
-                block.context.pop_context()
-                hostname = re.sub (r'Hostname:\s+', '', self.block(block_number + 1).first_line())
-                block.context.push_context('host', {'host': hostname})
-                block.context.set_property('group', self.hostname_group_mapping.get(hostname, 'UnknownGroup'))
-                # mark info and skip it
-                self.set_next_block_subtype (block_number, 'hostinfo')
-                block_number += 1
-                last_context = block.context
-            # set up a config file name
-            elif self.at_start_of_sequence (['subsep', 'text'], block_number) and block.context.at_top_context ('configuration') and self.block(block_number + 1).first_line().endswith('.xml'):
-                block.context.set_property ('filename', self.block (block_number + 1).first_line())
-                block.context.pop_property ('validation-results')
-                self.set_next_block_subtype (block_number, 'filename')
-                block_number += 1
-                last_context = block.context
-
-            # set up a config file validation
-            elif self.at_start_of_sequence (['subsep', 'text'], block_number) and block.context.at_top_context ('configuration') and self.block(block_number + 1).first_line().startswith('Validation results: '):
-                block.context.set_property ('validation-results', self.block(block_number + 1).first_line()[20:])
-                self.set_next_block_subtype (block_number, 'validation-results')
-                block_number += 1
-                last_context = block.context
-
-
-            elif self.at_start_of_sequence (['subsep', 'text'], block_number) and block.context.at_top_context ('configuration') and self.block(block_number + 1).first_line().startswith('Configuration file'): # doesn't exist
-                block.context.pop_property ('file')
-                block.context.pop_property ('filename')
-                block.context.pop_property ('validation-results')
-                last_context = block.context
-            # set up a log file
-            elif self.at_start_of_sequence (['subsep', 'text'], block_number) and block.context.at_top_context ('log-files') and self.block(block_number + 1).first_line().endswith('.txt'):
-                block.context.set_property ('filename', self.block (block_number + 1).first_line())
-                self.set_next_block_subtype (block_number, 'filename')
-                block_number += 1
-                last_context = block.context
-            # unclassified text block, must be some kind of file based on context?
-            elif block.type == 'text' and 'subtype' not in block.context.properties:
-                # these just get marked
-                if (   block.context.at_top_context ('database-topology')
-                    or block.context.at_top_context ('host-status')
-                    or block.context.at_top_context ('data-directory')
-                    or (block.context.at_top_context ('configuration') and not block.first_line().startswith ('Configuration file'))
-                    or (block.context.at_top_context ('log-files') and block.context.has_property ('filename'))
-                   ):
-                    block.context.set_property ('subtype', 'file')
-                # these extra db name from file text first line and remove that line
-                elif (   block.context.at_top_context ('trigger-definitions')
-                      or block.context.at_top_context ('cpf-domains')
-                      or block.context.at_top_context ('cpf-pipelines')
-                      or block.context.at_top_context ('flexrep-domains')
-                      or block.context.at_top_context ('sql-schemas')
-                      or block.context.at_top_context ('sql-views')
-                      or block.context.at_top_context ('xml-schemas')
-                    ):
-                    # gotta have more than the db name
-                    if len (block.text) > 1:
-                            block.context.set_property ('subtype', 'file')
-                            block.context.set_property ('database', block.text[0])
-                    else:  block.context.set_property ('subtype', 'empty-db')
-                # these extra db name from file text first line and remove that line
-                elif block.context.at_top_context ('forest-status'):
-                    block.context.set_property ('subtype', 'file')
-                    block.context.set_property ('forest-name', block.text[0])
-                    host_id = self.get_xml_value ('host-id', block.text)
-                    block.context.set_property ('host-id', host_id)
-                    # if this barfs KeyError ... is there a group with NO app-servers, so no mapping?  OK, default to the id
-                    block.context.set_property ('hostname', self.host_id_hostname_mapping.get(host_id, host_id))
-                elif block.context.at_top_context ('configuration') and block.first_line().startswith ('Configuration file'):
-                    block.context.set_property ('subtype', 'missing-file')
-                else:
-                    block.context.set_property('subtype', 'unhandled-text')
-            else:
-                pass
+        if context is None:
+            self.last_context = DumpContext ()
+            self.last_context.push_context ('dump', {'out-dir': self.out_dir})
+        else:
+            self.last_context = DumpContext.copy_context (context)
 
-            block_number = block_number + 1
+    # classify the next block (and the one after, when it is a heading), carry the context forward
+    def classify_block (self):
+        block_number = self.next_block
+        block = self.block(block_number)
+        # carry forward the last context to start
+        block.context = DumpContext.copy_context (self.last_context)
+
+        # means it was considered directly in the context run through
+        block.add_flag ('*')
+
+        rule = self.find_rule (block_number, block)
+        if rule is not None:
+            block_number = rule[1] (self, block_number, block)
+        # unclassified text block, must be some kind of file based on context?
+        elif block.type == 'text':
+            self.text_rules.get (block.context.get_top_context(), DumpBlocks.unhandled_text) (self, block)
+
+        self.next_block = block_number + 1
+
+    # the first rule (in classify_rules order) matching the types of this block and the next one or two,
+    # the top context and the next block's first line
+    def find_rule (self, block_number, block):
+        if self.rule_index is None:  self.index_rules ()
+        count = self.len ()
+        if block_number + 1 >= count:  return None
+        next_block = self.block(block_number + 1)
+        sequences = [(block.type, next_block.type)]
+        if block_number + 2 < count:
+            sequences.insert (0, (block.type, next_block.type, self.block(block_number + 2).type))
+        best = None
+        keys = None
+        for sequence in sequences:
+            rules = self.rule_index.get (sequence)
+            if rules is None:  continue
+            if keys is None:  keys = self.line_keys (next_block.first_line())
+            for top in (block.context.get_top_context(), None):
+                for key in keys:
+                    rule = rules.get ((top, key))
+                    if rule is not None and (best is None or rule[0] < best[0]):
+                        best = rule
+        return best
+
+    # the keys a first line can match:  itself (exact titles), 'prefix*', '*suffix' and None (any line)
+    def line_keys (self, line):
+        keys = [line]
+        for prefix in self.rule_prefixes:
+            if line.startswith (prefix):  keys.append (prefix + '*')
+        for suffix in self.rule_suffixes:
+            if line.endswith (suffix):  keys.append ('*' + suffix)
+        keys.append (None)
+        return keys
+
+    # sequence -> {(top context, line key): (priority, handler)}
+    rule_index = None
+
+    @classmethod
+    def index_rules (cls):
+        rules = list (cls.classify_rules)
+        # section titles without a rule of their own start a plain section, anywhere
+        titled = set (rule[2] for rule in rules)
+        for title in cls.subsection_titles:
+            if title not in titled:
+                rules.append ((('subsep', 'text', 'subsep'), None, title, DumpBlocks.start_section))
+        index = {}
+        prefixes = set ()
+        suffixes = set ()
+        for priority, (sequence, top, key, handler) in enumerate (rules):
+            index.setdefault (tuple (sequence), {}).setdefault ((top, key), (priority, handler))
+            if key is not None and key.endswith ('*'):  prefixes.add (key[:-1])
+            if key is not None and key.startswith ('*'):  suffixes.add (key[1:])
+        cls.rule_index = index
+        cls.rule_prefixes = sorted (prefixes)
+        cls.rule_suffixes = sorted (suffixes)
+
+    # add a classification rule, handler (blocks, block_number, block) returns the last block number it used;
+    # position in classify_rules sets its priority, default last
+    @classmethod
+    def add_rule (cls, sequence, top, line_key, handler, position=None):
+        cls.classify_rules = list (cls.classify_rules)
+        cls.classify_rules.insert (len (cls.classify_rules) if position is None else position, (tuple (sequence), top, line_key, handler))
+        cls.rule_index = None
+
+    # add a section title that starts a plain section, like 'Log Files'
+    @classmethod
+    def add_section (cls, title, section):
+        cls.subsection_titles = dict (cls.subsection_titles)
+        cls.subsection_titles[title] = section
+        cls.rule_index = None
+
+    # dump info at start of dump
+    def start_dump_info (self, block_number, block):
+        block.context.set_property ('host', self.get_hostname_from_host_info (self.block(block_number+1)))
+        block.context.push_context ('dump-info', {})
+        # mark heading and skip it
+        self.set_next_block_subtype (block_number, 'file')
+        self.last_context = block.context
+        return block_number + 1
 
-    def get_xml_value (self, element_name='xx-dd&&&<>', text_lines=[]):
-        for line in text_lines:
-            m = re.match(f'<{element_name}>(.*)</{element_name}>', line)
+    # dump dump-info -> dump - cluster - app-servers
+    def start_app_servers (self, block_number, block):
+        block.context.pop_context()
+        # any way to get group name?  set this from the app-server level too?
+        block.context.push_context('cluster', {})
+        block.context.push_context('app-servers', {})
+        # mark heading and skip it
+        self.set_next_block_subtype (block_number)
+        self.last_context = block.context
+        return block_number + 1
+
+    # app server server-status file
+    def app_server_file (self, block_number, block):
+        next_block = self.block(block_number + 1)
+        self.get_line_key_values (next_block.first_line(), block.context.top_properties())
+        hostname = block.context.get_property('host')
+        host_id = self.get_xml_value ('host-id', next_block.text)
+        self.host_id_hostname_mapping[host_id] = hostname
+        block.context.set_property ('host-id', host_id)
+        # save mappings for the later host sections
+        self.hostname_group_mapping[hostname] = block.context.get_property('group')
+        self.set_next_block_subtype (block_number, 'file')
+        # remove line to leave just xml
+        # self.block(block_number + 1).text[0 : 1] = []
+        self.last_context = block.context
+        return block_number + 1
+
+    # Database Topology - database-dump()
+    def start_database_topology (self, block_number, block):
+        block.context.pop_context()
+        # any way to get cluster name?  set this from the app-server level too?
+        block.context.push_context('database-topology', {})
+        # mark heading and skip it
+        self.set_next_block_subtype (block_number)
+        self.last_context = block.context
+        return block_number + 1
+
+    # forest-dump, and all similar section headings
+    def start_section (self, block_number, block):
+        block_number, self.last_context = self.set_section (block_number, self.block(block_number + 1).first_line())
+        return block_number
+
+    def start_host_status (self, block_number, block):
+        block.context.push_context('host-status', {})
+        # mark heading and skip it
+        self.set_next_block_subtype (block_number)
+        self.last_context = block.context
+        return block_number + 1
+
+    # start of new host
+    ## TODO  figure it out, what level to pop to, or restart new context?
+    def start_host (self, block_number, block):
+        block.context.pop_context()
+        block.context.pop_context()
+        hostname = hostname_pattern.sub ('', self.block(block_number + 1).first_line())
+        block.context.push_context('host', {'host': hostname})
+        block.context.set_property('group', self.hostname_group_mapping.get(hostname, 'UnknownGroup'))
+        # mark info and skip it
+        self.set_next_block_subtype (block_number, 'hostinfo')
+        self.last_context = block.context
+        return block_number + 1
+
+    # set up a config file name
+    def config_filename (self, block_number, block):
+        block.context.set_property ('filename', self.block (block_number + 1).first_line())
+        block.context.pop_property ('validation-results')
+        self.set_next_block_subtype (block_number, 'filename')
+        self.last_context = block.context
+        return block_number + 1
+
+    # set up a config file validation
+    def config_validation (self, block_number, block):
+        block.context.set_property ('validation-results', self.block(block_number + 1).first_line()[20:])
+        self.set_next_block_subtype (block_number, 'validation-results')
+        self.last_context = block.context
+        return block_number + 1
+
+    def config_missing (self, block_number, block): # doesn't exist
+        block.context.pop_property ('file')
+        block.context.pop_property ('filename')
+        block.context.pop_property ('validation-results')
+        self.last_context = block.context
+        return block_number
+
+    # set up a log file
+    def log_filename (self, block_number, block):
+        block.context.set_property ('filename', self.block (block_number + 1).first_line())
+        self.set_next_block_subtype (block_number, 'filename')
+        self.last_context = block.context
+        return block_number + 1
+
+    # (priority order) block types from this block on, top context (None for any),
+    # the next block's first line (exact, 'prefix*', '*suffix', None for any), handler
+    classify_rules = [
+        (('bigsep', 'text', 'bigsep'), 'dump', None, start_dump_info),
+        (('subsep', 'text', 'subsep'), 'dump-info', 'App Server Status', start_app_servers),
+        (('subsep', 'text'), 'app-servers', 'Group:*', app_server_file),
+        (('subsep', 'text', 'subsep'), 'app-servers', 'Database Topology', start_database_topology),
+        (('subsep', 'text', 'subsep'), 'database-topology', 'Forest Status', start_section),
+        (('subsep', 'text', 'subsep'), None, 'Host Status', start_host_status),
+        (('bigsep', 'text', 'bigsep'), None, 'Hostname:*', start_host),
+        (('subsep', 'text'), 'configuration', '*.xml', config_filename),
+        (('subsep', 'text'), 'configuration', 'Validation results: *', config_validation),
+        (('subsep', 'text'), 'configuration', 'Configuration file*', config_missing),
+        (('subsep', 'text'), 'log-files', '*.txt', log_filename),
+    ]
+
+    # text blocks no rule took, by top context
+
+    # these just get marked
+    def text_file (self, block):
+        block.context.set_property ('subtype', 'file')
+
+    def configuration_text (self, block):
+        if block.first_line().startswith ('Configuration file'):
+            block.context.set_property ('subtype', 'missing-file')
+        else:
+            block.context.set_property ('subtype', 'file')
+
+    def log_text (self, block):
+        if block.context.has_property ('filename'):
+            block.context.set_property ('subtype', 'file')
+        else:
+            block.context.set_property ('subtype', 'unhandled-text')
+
+    # these extra db name from file text first line and remove that line
+    def database_text (self, block):
+        # gotta have more than the db name
+        if len (block.text) > 1:
+                block.context.set_property ('subtype', 'file')
+                block.context.set_property ('database', block.text[0])
+        else:  block.context.set_property ('subtype', 'empty-db')
+
+    # these extra db name from file text first line and remove that line
+    def forest_text (self, block):
+        block.context.set_property ('subtype', 'file')
+        block.context.set_property ('forest-name', block.text[0])
+        host_id = self.get_xml_value ('host-id', block.text)
+        block.context.set_property ('host-id', host_id)
+        # if this barfs KeyError ... is there a group with NO app-servers, so no mapping?  OK, default to the id
+        hostname = self.host_id_hostname_mapping.get(host_id, host_id)
+        block.context.set_property ('hostname', hostname)
+        # the forest's own host and group, not the report host's, for the path and whatever goes by context
+        block.context.set_property ('host', hostname)
+        block.context.set_property ('group', self.hostname_group_mapping.get(hostname, 'UnknownGroup'))
+
+    def unhandled_text (self, block):
+        block.context.set_property('subtype', 'unhandled-text')
+
+    text_rules = {
+        'database-topology': text_file,
+        'host-status': text_file,
+        'data-directory': text_file,
+        'configuration': configuration_text,
+        'log-files': log_text,
+        'trigger-definitions': database_text,
+        'cpf-domains': database_text,
+        'cpf-pipelines': database_text,
+        'flexrep-domains': database_text,
+        'sql-schemas': database_text,
+        'sql-views': database_text,
+        'xml-schemas': database_text,
+        'forest-status': forest_text,
+    }
+
+    # first value of the element in lines start to end (default all)
+    def get_xml_value (self, element_name='xx-dd&&&<>', text_lines=[], start=0, end=None):
+        pattern = xml_value_pattern (element_name)
+        if end is None:  end = len (text_lines) - 1
+        for i in range (start, end + 1):
+            m = pattern.match (text_lines[i])
             if m:
-                return m.group(1)
+                return m.group(2)
 
     def ready_files (self):
-        # go through subtype=file blocks, and save a list of the file as [filename, [start-line, end-line]] pairs
-        block_number = 0
-        saw_database_topology = False
-        while block_number < len (self.blocks):
-            block = self.blocks[block_number]
-            context = block.context
-            if block.type == 'text' and context.get_property ('subtype') == 'file':
-                if context.at_top_context ('app-servers'):
-                    path = f'{context.find_property("out-dir")}/{context.get_property("group")}/{context.get_property("host")}/App-Servers/{context.get_property("appserver")}-Status.xml'
-                    block.files.append ([path, [1, len(block.text) - 1]])
-                elif context.at_top_context ('dump-info'):
-                    path = f'{context.find_property("out-dir")}/Support-Request.txt'
-                    block.files.append ([path, [0, len(block.text) - 1]])
-                elif context.at_top_context ('database-topology'):
-                    block.context.set_property ('header', '===================================')
-                    path = f'{context.find_property("out-dir")}/Database-Topology.txt'
-                    block.files.append ([path, [0, len(block.text) - 1]])
-                    if saw_database_topology == False:
-                        saw_database_topology = True
-                    else: 
-                        block.context.set_property ('write-mode', 'append')
-                elif context.at_top_context ('configuration'):
-                    path = f'{context.find_property("out-dir")}/{context.find_property("group")}/{context.find_property("host")}/Configuration/{context.get_property("filename")}'
-                    block.files.append ([path, [0, len(block.text) - 1]])
-                elif context.at_top_context ('log-files'):
-                    filename = re.sub (r'.*/', '', context.get_property ('filename'))
-                    path = f'{context.find_property("out-dir")}/{context.find_property("group")}/{context.find_property("host")}/Logs/{filename}'
-                    block.files.append ([path, [0, len(block.text) - 1]])
-                elif context.at_top_context ('host-status'):
-                    self.get_check_xml (block)
-                elif context.at_top_context ('forest-status'):
-                    self.get_check_xml (block)
-                elif context.at_top_context ('cpf-domains'):
-                    self.get_check_xml (block)
-                elif context.at_top_context ('xml-schemas'):
-                    self.get_check_xml (block)
-                elif context.at_top_context ('sql-views'):
-                    self.get_check_xml (block)
-                elif context.at_top_context ('sql-schemas'):
-                    self.get_check_xml (block)
-                elif context.at_top_context ('trigger-definitions'):
-                    self.get_check_xml (block)
-                elif context.at_top_context ('cpf-pipelines'):
-                    self.get_check_xml (block)
-                elif context.at_top_context ('flexrep-domains'):
-                    self.get_check_xml (block)
-                else:
-                    block.context.set_property ('unhandled', 'true')
-                    print (f'ERROR:  unhandled text starting at line {block.start_line}', file=sys.stderr)
-            block_number = block_number + 1
+        # go through subtype=file blocks, and save a list of the file as (filename, (start-line, end-line)) pairs
+        self.saw_database_topology = False
+        for block in self.blocks:
+            self.timed ('ready', block, self.ready_block, block)
+
+    def ready_block (self, block):
+        context = block.context
+        if block.type == 'text' and context.get_property ('subtype') == 'file':
+            if self.filter is not None and not self.filter.keeps_context (context):
+                block.context.set_property ('filtered', 'true')
+                return
+            if context.at_top_context ('app-servers'):
+                path = f'{context.find_property("out-dir")}/{context.get_property("group")}/{context.get_property("host")}/App-Servers/{context.get_property("appserver")}-Status.xml'
+                block.add_file (path, 1, len(block.text) - 1)
+                if self.metrics is not None:  self.metrics.add_app_server (context, block.text[1:], block.start_line + 1)
+            elif context.at_top_context ('dump-info'):
+                path = f'{context.find_property("out-dir")}/Support-Request.txt'
+                block.add_file (path, 0, len(block.text) - 1)
+            elif context.at_top_context ('database-topology'):
+                block.context.set_property ('header', '===================================')
+                path = f'{context.find_property("out-dir")}/Database-Topology.txt'
+                block.add_file (path, 0, len(block.text) - 1)
+                if self.saw_database_topology == False:
+                    self.saw_database_topology = True
+                else: 
+                    block.context.set_property ('write-mode', 'append')
+            elif context.at_top_context ('configuration'):
+                path = f'{context.find_property("out-dir")}/{context.find_property("group")}/{context.find_property("host")}/Configuration/{context.get_property("filename")}'
+                block.add_file (path, 0, len(block.text) - 1)
+            elif context.at_top_context ('log-files'):
+                filename = re.sub (r'.*/', '', context.get_property ('filename'))
+                path = f'{context.find_property("out-dir")}/{context.find_property("group")}/{context.find_property("host")}/Logs/{filename}'
+                block.add_file (path, 0, len(block.text) - 1)
+                relative = os.path.relpath (path, context.find_property ('out-dir'))
+                if self.log_index is not None and (self.filter is None or self.filter.keeps_path (relative)):
+                    self.log_index.add (relative, context, block.text)
+            elif context.at_top_context ('host-status'):
+                self.get_check_xml (block)
+            elif context.at_top_context ('forest-status'):
+                self.get_check_xml (block)
+            elif context.at_top_context ('cpf-domains'):
+                self.get_check_xml (block)
+            elif context.at_top_context ('xml-schemas'):
+                self.get_check_xml (block)
+            elif context.at_top_context ('sql-views'):
+                self.get_check_xml (block)
+            elif context.at_top_context ('sql-schemas'):
+                self.get_check_xml (block)
+            elif context.at_top_context ('trigger-definitions'):
+                self.get_check_xml (block)
+            elif context.at_top_context ('cpf-pipelines'):
+                self.get_check_xml (block)
+            elif context.at_top_context ('flexrep-domains'):
+                self.get_check_xml (block)
+            else:
+                block.context.set_property ('unhandled', 'true')
+                print (f'ERROR:  unhandled text starting at line {block.start_line}', file=sys.stderr)
         
+    # the id elements that get_check_xml files are named by, picked up while scanning
+    xml_id_elements = {
+        'flexrep-domains': ['flexrep:domain-id'],
+        'trigger-definitions': ['trgr:trigger-id'],
+        'sql-schemas': ['view:schema-id'],
+        'sql-views': ['view:view-id'],
+        'cpf-pipelines': ['p:pipeline-id'],
+        'cpf-domains': ['dom:domain-id', 'dom:config-id'],
+    }
+
     def get_check_xml (self, block):
         lines = block.text
         context = block.context
@@ -431,15 +2437,25 @@ class DumpBlocks:
         line_number = 0
         start_line = -1
         file_number = 1
+        # sometimes first line is not part of the file
+        skip_first_line = context.get_top_context() in ['xml-schemas','sql-schemas','trigger-definitions','forest-status','cpf-domains','cpf-pipelines','flexrep-domains']
+        id_elements = self.xml_id_elements.get (context.get_top_context(), [])
+        id_pattern = xml_value_pattern ('|'.join (id_elements)) if id_elements else None
+        # first value of each id element in the current element
+        ids = {}
+        collect = self.metrics.collector (context, self.hostname_group_mapping) if self.metrics is not None else None
         for line in lines:
             #print (f'block l{block.start_line}, line {line_number}')
-            # sometimes first line is not part of the file
-            if context.get_top_context() in ['xml-schemas','sql-schemas','trigger-definitions','forest-status','cpf-domains','cpf-pipelines','flexrep-domains'] and line_number == 0:
+            if skip_first_line and line_number == 0:
                 line_number += 1
                 continue
-            m = re.match(r'\s*<(/?)([^>\s]+)', line)
+            if collect is not None:  collect.line (line)
+            m = element_tag_pattern.match (line)
             if m:
                 end_slash, element_name = m.group(1), m.group(2)
+                if id_pattern is not None and not end_slash and element_name in id_elements:
+                    id_match = id_pattern.match (line)
+                    if id_match:  ids.setdefault (id_match.group(1), id_match.group(2))
                 if end_slash:
                     # end element
                     if current_element == element_name:
@@ -449,61 +2465,64 @@ class DumpBlocks:
                         filename = element_name
                         if context.at_top_context ('xml-schemas'):
                             path = f'{context.find_property("out-dir")}/Schemas/{context.get_property("database")}/Schema-{file_number}.xml'
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
                         elif context.at_top_context ('flexrep-domains'):
                             if (element_name == 'domain-status'):
                                 path = f'{context.find_property("out-dir")}/Flexrep/{context.get_property("database")}/Domain-Status-{file_number}.xml'
                             elif (element_name == 'flexrep:configuration'):
-                                domain_id = self.get_xml_value ('flexrep:domain-id', block.text[start_line:end_line+1])
+                                domain_id = ids.get ('flexrep:domain-id')
                                 path = f'{context.find_property("out-dir")}/Flexrep/{context.get_property("database")}/Flexrep-Configuration-{domain_id}.xml'
                             else:
                                 print ('huh?  what is {element_name}', file=sys.stderr)
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
                         elif context.at_top_context ('trigger-definitions'):
-                            trigger_id = self.get_xml_value ('trgr:trigger-id', block.text[start_line:end_line+1])
+                            trigger_id = ids.get ('trgr:trigger-id')
                             path = f'{context.find_property("out-dir")}/Triggers/{context.get_property("database")}/Trigger-{trigger_id}.xml'
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
                         elif context.at_top_context ('sql-schemas'):
-                            schema_id = self.get_xml_value ('view:schema-id', block.text[start_line:end_line+1])
+                            schema_id = ids.get ('view:schema-id')
                             path = f'{context.find_property("out-dir")}/SQL/{context.get_property("database")}/Schema-{schema_id}.xml'
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
                         elif context.at_top_context ('sql-views'):
-                            view_id = self.get_xml_value ('view:view-id', block.text[start_line:end_line+1])
+                            view_id = ids.get ('view:view-id')
                             path = f'{context.find_property("out-dir")}/SQL/{context.get_property("database")}/View-{view_id}.xml'
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
                         elif context.at_top_context ('cpf-pipelines'):
-                            id = self.get_xml_value ('p:pipeline-id', block.text[start_line:end_line+1])
+                            id = ids.get ('p:pipeline-id')
                             path = f'{context.find_property("out-dir")}/CPF/{context.get_property("database")}/Pipeline-{id}.xml'
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
                         elif context.at_top_context ('cpf-domains'):
                             if element_name == 'dom:domain':
-                                domain_id = self.get_xml_value ('dom:domain-id', block.text[start_line:end_line+1])
+                                domain_id = ids.get ('dom:domain-id')
                                 path = f'{context.find_property("out-dir")}/CPF/{context.get_property("database")}/Domain-{domain_id}.xml'
                             elif element_name == 'dom:configuration':
-                                configuration_id = self.get_xml_value ('dom:config-id', block.text[start_line:end_line+1])
+                                configuration_id = ids.get ('dom:config-id')
                                 path = f'{context.find_property("out-dir")}/CPF/{context.get_property("database")}/Configuration-{configuration_id}.xml'
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
                         elif context.at_top_context ('forest-status'):
-                            hostname = block.context.find_property("hostname")
-                            group = self.hostname_group_mapping.get(hostname, 'UnknownGroup')
+                            hostname = block.context.get_property("hostname")
+                            group = block.context.get_property("group")
                             #path = f'{context.find_property("out-dir")}/{group}/{hostname}/Forests/{forest_name}/Forest-Status.xml'
                             filename = element_name.title()
                             path = f'{context.find_property("out-dir")}/{group}/{hostname}/Forests/{block.context.find_property("forest-name")}/{filename}.xml'
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
                         elif context.at_top_context ('host-status'):
                             hostname = block.context.find_property("host")
                             group = self.hostname_group_mapping.get(hostname, 'UnknownGroup')
                             filename = element_name.title()
                             path = f'{context.find_property("out-dir")}/{group}/{hostname}/{filename}.xml'
-                            block.files.append ([path, [start_line, end_line]])
+                            block.add_file (path, start_line, end_line)
+                        if collect is not None:  collect.end (element_name, block.start_line + start_line)
                         current_element = '---';
                         start_line = -1
                         file_number += 1
+                        ids = {}
                 else:
                     # start element but gotta handle also singletons
                     if current_element == '---':
-                        if re.fullmatch (r'<[^<]+/>\s*', line):
+                        if singleton_pattern.fullmatch (line):
                             print (f'WARNING? Singleton?: {line}', file=sys.stderr)
+                            ids = {}
                         else:
                             # start a new one
                             start_line = line_number
@@ -517,62 +2536,446 @@ class DumpBlocks:
 
     def write_files (self):
         for block in self.blocks:
-            for file in block.files:
-                path, limits = file
-
-                m = re.match(r'^(.*)/(.*)', path)
-                dirs, filename = m.group(1), m.group(2)
-
-                os.makedirs (dirs, 0o777, True)
-                write_mode = 'a' if block.context.get_property ('write-mode') == 'append' else 'w' 
-                with open(path, write_mode) as f:
-                    if block.context.get_property ('header'):
-                        f.write (block.context.get_property ('header') + '\n')
-                    for line in block.text[limits[0]:limits[1] + 1]:
-                        f.write (line + '\n')
-
-
-
-blocks = DumpBlocks()
-line_number = 0
-
-parser = argparse.ArgumentParser (
-    description='Parse a support dump.'
-)
-
-parser.add_argument ('-file', dest='dumpfile', required=True, help='dump file to parse')
-parser.add_argument ('-debug', dest='debug', default=False, help='debug output, True or False')
-
-args = parser.parse_args()
-
-if args.debug:  print (args)
-
-with open(args.dumpfile, encoding='utf-8') as dumpfile:
-    for line in dumpfile:
-        line_number += 1
-        str = line.strip()
-        blocks.add_line (str, line_number)
-
-#if args.debug:  blocks.dump()
-
-
-# where do I do this?
-
-#        # get rid of leading blank lines in text blocks
-#        if block.type == 'text':
-#            while block.has_lines() and re.fullmatch (r'\s*', block.text[0]):
-#                block.text[0:1] = []
-
-
-
-blocks.context_run_through()
-blocks.ready_files()
-blocks.write_files()
-
-if args.debug:  blocks.dump()
-
-# blocks.write_files()
-
-
+            self.timed ('write', block, self.write_block, block)
+            if self.stats is not None:  self.stats.add_block (block)
+        self.writer.close ()
 
+    def write_block (self, block):
+        for file in block.files:
+            path, limits = file
 
+            write_mode = 'a' if block.context.get_property ('write-mode') == 'append' else 'w' 
+            header = block.context.get_property ('header')
+            if self.filter is not None and not self.filter.keeps_path (os.path.relpath (path, block.context.find_property ('out-dir'))):
+                continue
+            if self.index is not None:
+                self.index.add (block, path, write_mode, header, limits)
+                continue
+            if isinstance (block.text, DumpLines):
+                pieces = [(header + '\n').encode ('utf-8')] if header else []
+                pieces.extend (block.text.pieces (limits[0], limits[1]))
+            else:
+                # the whole file in one write
+                lines = block.text[limits[0]:limits[1] + 1]
+                if header:  lines.insert (0, header)
+                pieces = [('\n'.join (lines) + '\n').encode ('utf-8')] if len (lines) > 0 else []
+            if self.stats is not None:  self.stats.wrote (block, path, pieces)
+            if self.records is not None:
+                self.records.add (block, path, write_mode, pieces)
+            elif self.journal is not None:
+                pieces = list (pieces)
+                write_mode, done = self.journal.segment (path, write_mode, pieces, [block.start_line + limits[0], block.start_line + limits[1]])
+                if write_mode is not None:  self.writer.write (path, write_mode, pieces, done)
+            else:
+                self.writer.write (path, write_mode, pieces)
+
+
+# the output files of a dump, as (path relative to the output directory, context properties, bytes) as it
+# is read, nothing written;  dump is a path or a binary file object, either maybe compressed (a stream
+# has to be able to seek or peek for that to be seen, else it is taken as plain text).  With use_mmap the
+# data of a file copied straight from the dump is a memoryview into it, good until the iteration ends
+def iter_files (dump, use_mmap=False, filter=None, out_dir='./Support-Dump'):
+    blocks = DumpBlocks ()
+    blocks.out_dir = out_dir
+    blocks.records = DumpRecords ()
+    blocks.filter = filter
+    records = blocks.records
+    blocks.start_stream ()
+    is_path = isinstance (dump, (str, os.PathLike))
+    try:
+        line_number = 0
+        if is_path and use_mmap and dump_compression (dump) is None:
+            blocks.source = DumpSource (dump)
+            for start, end in blocks.source.chunks (size=blocks.chunk_size):
+                line_number = blocks.add_source_chunk (start, end, line_number)
+                if records.ready:  yield from records.take ()
+        else:
+            # closed however the iteration ends;  the caller's file stays open
+            with open_dump (dump) if is_path else open_dump_stream (dump) as dumpfile:
+                for chunk in read_chunks (dumpfile, size=blocks.chunk_size):
+                    line_number = blocks.add_chunk (text_chunk (chunk), line_number)
+                    if records.ready:  yield from records.take ()
+        blocks.finish_stream ()
+        records.flush ()
+        yield from records.take ()
+    finally:
+        if blocks.source is not None:  blocks.source.close ()
+
+
+# one host section, in a worker process
+def parse_host_section (path, start, end, line_number, args, state):
+    blocks = DumpBlocks()
+    blocks.hostname_group_mapping, blocks.host_id_hostname_mapping, context = state
+    blocks.debug = args.debug
+    blocks.writer = make_writer (args)
+    if args.pipeline:  blocks.read_ahead = DumpBlocks.pipeline_depth
+    blocks.filter = make_filter (args)
+    if args.stats:  blocks.stats = DumpStats ()
+    if args.resume:  blocks.journal = DumpJournal (args.out_dir)
+    if args.metrics or args.checks:  blocks.metrics = DumpMetrics ()
+    if args.log_index:  blocks.log_index = DumpLogIndex (args.log_index_lines)
+    blocks.parse (path, args.mmap, args.stream, start, end, line_number, context)
+    if args.resume:  blocks.journal.close ()
+    return blocks.stats, blocks.metrics, blocks.log_index
+
+# cluster part first, for the mappings, then the host sections across processes
+def parse_host_sections (blocks, args):
+    sections = DumpBlocks.index_host_sections (args.dumpfile)
+    if len (sections) == 0:
+        blocks.parse (args.dumpfile, args.mmap, args.stream)
+        return
+    # each part reads the first line of the next one too, so the classifier sees the next bigsep
+    blocks.parse (args.dumpfile, args.mmap, args.stream, 0, sections[0][1], 0)
+    state = (blocks.hostname_group_mapping, blocks.host_id_hostname_mapping, blocks.last_context)
+    with blocks.phase ('host-sections'), ProcessPoolExecutor (args.jobs) as pool:
+        futures = []
+        for i, (start, first_line_end, line_number) in enumerate (sections):
+            end = sections[i + 1][1] if i + 1 < len (sections) else None
+            futures.append (pool.submit (parse_host_section, args.dumpfile, start, end, line_number, args, state))
+        for future, section in zip (futures, sections):
+            stats, metrics, log_index = future.result ()
+            if stats is not None:  blocks.stats.merge (stats, f'host section at line {section[2] + 1}')
+            if metrics is not None:  blocks.metrics.merge (metrics)
+            if log_index is not None:  blocks.log_index.merge (log_index)
+
+
+def make_writer (args, out_dir=None):
+    if args.archive:
+        return DumpArchive (args.archive)
+    if args.store:
+        return DumpStore (args.store, out_dir or args.out_dir)
+    writer = DumpWriter (args.workers, 'gzip' if args.gzip else None, args.pipeline)
+    writer.store_links = os.path.exists (os.path.join (out_dir or args.out_dir, DumpStore.hashes_name))
+    return writer
+
+
+# None when nothing is filtered
+def make_filter (args):
+    lists = {name: getattr (args, name).split (',') if getattr (args, name) else None
+             for name in ('sections', 'hosts', 'groups', 'forests', 'databases', 'paths')}
+    if all (value is None for value in lists.values ()):  return None
+    return DumpFilter (**lists)
+
+
+# write the files matching the globs from the dump's index, making the index first if it isn't there
+def extract_files (args):
+    filter = make_filter (args)
+    found = DumpIndex.read (args.dumpfile, args.extract, filter=filter)
+    if found is None:
+        print (f'WARNING:  no index for {args.dumpfile}, or it is out of date or made with other filters, indexing it first', file=sys.stderr)
+        build_index (args)
+        found = DumpIndex.read (args.dumpfile, args.extract, filter=filter)
+    info, entries = found
+    if len (entries) == 0:
+        print (f'WARNING:  nothing in the index matches {" ".join (args.extract)}', file=sys.stderr)
+    source = DumpSource (args.dumpfile)
+    out_dir = args.out_dir if args.out_dir_given else info['out-dir']
+    if args.store:  DumpStore.start_hashes (out_dir)
+    writer = make_writer (args, out_dir)
+    for entry in entries:
+        writer.write (f'{out_dir}/{entry["path"]}', entry['mode'], index_pieces (source, entry))
+    writer.close ()
+    source.close ()
+    if args.store:  DumpStore.sort_hashes (out_dir)
+
+def load_files (args):
+    loader = DumpLoader (args.load, args.load_user, args.load_password, args.load_auth,
+                         args.load_collections.split (','), args.load_database, args.load_batch,
+                         threads=args.load_threads, uri_prefix=args.load_uri_prefix)
+    start = time.perf_counter ()
+    loader.load (iter_files (args.dumpfile, args.mmap, make_filter (args), args.out_dir))
+    seconds = time.perf_counter () - start
+    print (f'loaded {loader.documents} documents, {loader.bytes / 1e6:.1f} MB in {loader.batches} batches, {seconds:.1f} s')
+
+# print the log entries from args.log_from to args.log_to across all the hosts, from the log time index
+# in the output directory, parsing the dump for it first if it isn't there
+def log_range (args):
+    first = log_time (args.log_from)
+    last = log_time (args.log_to)
+    entries = DumpLogIndex.read (args.out_dir)
+    if entries is None:
+        print (f'WARNING:  no log time index in {args.out_dir}, parsing {args.dumpfile} for it first', file=sys.stderr)
+        args.log_from = args.log_to = None
+        run (args)
+        entries = DumpLogIndex.read (args.out_dir)
+    for line in DumpLogIndex.timeline (args.out_dir, entries, first, last):
+        sys.stdout.write (line)
+
+# 2020-09-13T12:26 as the logs write it
+def log_time (text):
+    return text.replace ('T', ' ') if text else None
+
+def write_timeline (log_index, out_dir):
+    with open (os.path.join (out_dir, 'Logs-Timeline.txt'), 'w', encoding='utf-8') as f:
+        f.writelines (DumpLogIndex.timeline (out_dir, log_index.files))
+
+def build_index (args):
+    blocks = DumpBlocks()
+    blocks.out_dir = args.out_dir
+    blocks.filter = make_filter (args)
+    blocks.index = DumpIndex (args.dumpfile, filter=blocks.filter)
+    blocks.parse (args.dumpfile, True, args.stream)
+    blocks.index.close ()
+
+
+# parse one dump the way args say, returns its DumpBlocks (stats for -stats, bytes read), or None when
+# it only indexed, extracted, loaded or printed logs
+def run (args):
+    # compressed dumps can only be read straight through
+    if dump_compression (args.dumpfile) is not None and (args.mmap or args.jobs > 1):
+        print (f'WARNING:  {args.dumpfile} is compressed, reading it without -mmap and -jobs', file=sys.stderr)
+        args.mmap = False
+        args.jobs = 1
+    if (args.index or args.extract) and dump_compression (args.dumpfile) is not None:
+        print (f'ERROR:  {args.dumpfile} is compressed, an index needs byte offsets into the dump itself', file=sys.stderr)
+        sys.exit (1)
+    if args.index or args.extract or args.load:
+        args.jobs = 1
+    if args.store and (args.archive or args.gzip):
+        print ('ERROR:  -store links plain output files, it can\'t go with -archive or -gzip', file=sys.stderr)
+        sys.exit (1)
+    if args.resume and (args.archive or args.gzip or args.store):
+        print ('WARNING:  -resume needs plain output files of its own, running without it', file=sys.stderr)
+        args.resume = False
+    if args.archive and args.jobs > 1:
+        print ('WARNING:  one archive can\'t be written from several processes, reading without -jobs', file=sys.stderr)
+        args.jobs = 1
+    # the stages only overlap when each block is written as soon as it is parsed
+    if args.pipeline:  args.stream = True
+    if args.timeline or args.log_from or args.log_to:
+        args.log_index = True
+    if args.log_index and (args.archive or args.gzip):
+        print ('ERROR:  the log time index and timeline need plain output files, not -archive or -gzip', file=sys.stderr)
+        sys.exit (1)
+
+    if args.log_from or args.log_to:
+        log_range (args)
+        return None
+    if args.extract:
+        extract_files (args)
+        return None
+    if args.load:
+        load_files (args)
+        return None
+    if args.index:
+        build_index (args)
+        return None
+
+    blocks = DumpBlocks()
+    blocks.debug = args.debug
+    blocks.out_dir = args.out_dir
+    if args.store:  DumpStore.start_hashes (args.out_dir)
+    blocks.writer = make_writer (args)
+    if args.pipeline:  blocks.read_ahead = DumpBlocks.pipeline_depth
+    blocks.filter = make_filter (args)
+    if args.stats:  blocks.stats = DumpStats ()
+    if args.resume:  blocks.journal = DumpJournal (args.out_dir)
+    if args.metrics or args.checks:  blocks.metrics = DumpMetrics ()
+    if args.log_index:  blocks.log_index = DumpLogIndex (args.log_index_lines)
+
+    if args.jobs > 1:
+        parse_host_sections (blocks, args)
+    else:
+        blocks.parse (args.dumpfile, args.mmap, args.stream)
+
+    if args.resume:
+        blocks.journal.close ()
+        blocks.journal.compact ()
+    if blocks.metrics is not None:  run_checks (blocks.metrics, args)
+    if blocks.log_index is not None:
+        blocks.log_index.write (args.out_dir)
+        if args.timeline:  write_timeline (blocks.log_index, args.out_dir)
+    if args.store:  store_summary (args)
+    return blocks
+
+
+# sort the content hashes, and say what the store saved and what changed since another tree
+def store_summary (args):
+    DumpStore.sort_hashes (args.out_dir)
+    hashes = DumpStore.read_hashes (args.out_dir)
+    print (f'store:  {len (hashes)} files, {len (set (hashes.values ()))} different, in {args.store}')
+    if args.changed_since:
+        if not os.path.exists (os.path.join (args.changed_since, DumpStore.hashes_name)):
+            print (f'ERROR:  no {DumpStore.hashes_name} in {args.changed_since} to compare with', file=sys.stderr)
+            return
+        changed, added, removed = DumpStore.changes (args.changed_since, args.out_dir)
+        for label, paths in (('changed', changed), ('added', added), ('removed', removed)):
+            for path in paths:
+                print (f'{label}:  {path}')
+        print (f'{len (changed)} changed, {len (added)} added, {len (removed)} removed since {args.changed_since}')
+
+
+# write the metrics tables and run the checks on them
+def run_checks (metrics, args):
+    if args.metrics:
+        os.makedirs (os.path.dirname (args.metrics) or '.', 0o777, True)
+    db = metrics.connect (args.metrics or ':memory:')
+    if args.checks:
+        for title, check in (('stuck transactions', DumpMetrics.stuck_transactions), ('app server threads/queue', DumpMetrics.app_server_threads)):
+            print (f'{title}:')
+            for line in check (db):
+                print (f'  {line}' if line else '')
+    db.close ()
+
+
+# the dumps in a directory, or matching a glob
+def find_dumps (pattern):
+    if os.path.isdir (pattern):
+        paths = [os.path.join (pattern, name) for name in os.listdir (pattern)]
+    else:
+        paths = glob.glob (pattern)
+    return sorted (path for path in paths if os.path.isfile (path) and not path.endswith ('.index'))
+
+# dump-1.txt.gz -> dump-1
+def dump_name (path):
+    name = os.path.basename (path)
+    for extension in ('.gz', '.bz2', '.xz', '.zst', '.zip'):
+        if name.endswith (extension):  name = name[:-len (extension)]
+    return os.path.splitext (name)[0]
+
+# a guess at the peak memory of parsing a dump, from what -stream, -mmap and the default take for each byte
+def memory_estimate (path, args):
+    if args.stream:  return 64e6
+    size = os.path.getsize (path)
+    # compressed text is mostly 5 to 10 times smaller
+    if dump_compression (path) is not None:  size *= 6
+    return 30e6 + size * (1.5 if args.mmap else 2.5)
+
+# one dump of a batch, in a worker process:  (seconds, stats report, bytes of dump text)
+def batch_dump (args, dumpfile, out_dir):
+    args = argparse.Namespace (**vars (args))
+    args.dumpfile = dumpfile
+    args.out_dir = out_dir
+    args.jobs = 1
+    # each dump's own metrics
+    if args.metrics:  args.metrics = os.path.join (out_dir, os.path.basename (args.metrics))
+    start = time.perf_counter ()
+    blocks = run (args)
+    seconds = time.perf_counter () - start
+    if blocks is None:  return seconds, None, os.path.getsize (dumpfile)
+    # a compressed dump's MB/s goes by what it decompressed to, not the file
+    return seconds, None if blocks.stats is None else blocks.stats.report (), blocks.bytes_read
+
+# the dumps over a pool of processes, biggest first, as many at once as the memory budget allows
+def batch_dumps (args):
+    dumps = find_dumps (args.batch)
+    if len (dumps) == 0:
+        print (f'ERROR:  no dumps in {args.batch}', file=sys.stderr)
+        sys.exit (1)
+    out_dirs = {}
+    for dumpfile in dumps:
+        name = dump_name (dumpfile)
+        out_dir = os.path.join (args.out_dir, name)
+        suffix = 2
+        while out_dir in out_dirs.values ():
+            out_dir = os.path.join (args.out_dir, f'{name}-{suffix}')
+            suffix += 1
+        out_dirs[dumpfile] = out_dir
+    budget = args.memory_budget * 1e6
+    pending = sorted (dumps, key=lambda path: memory_estimate (path, args), reverse=True)
+    running = {}
+    reports = {}
+    total_bytes = 0
+    failed = 0
+    start = time.perf_counter ()
+    with ProcessPoolExecutor (args.batch_jobs) as pool:
+        while pending or running:
+            used = sum (estimate for dumpfile, estimate in running.values ())
+            # the biggest that fits, or the biggest of all when nothing is running
+            for dumpfile in list (pending):
+                if len (running) >= args.batch_jobs:  break
+                estimate = memory_estimate (dumpfile, args)
+                if len (running) == 0 or used + estimate <= budget:
+                    running[pool.submit (batch_dump, args, dumpfile, out_dirs[dumpfile])] = (dumpfile, estimate)
+                    pending.remove (dumpfile)
+                    used += estimate
+            done, _ = wait (running, return_when=FIRST_COMPLETED)
+            for future in done:
+                dumpfile, estimate = running.pop (future)
+                try:
+                    seconds, report, size = future.result ()
+                except BaseException as e:
+                    failed += 1
+                    print (f'ERROR:  {dumpfile} failed:  {e!r}', file=sys.stderr)
+                    continue
+                total_bytes += size
+                print (f'{dumpfile}:  {size / 1e6:.1f} MB in {seconds:.1f} s, {size / 1e6 / max (seconds, 1e-6):.1f} MB/s -> {out_dirs[dumpfile]}', flush=True)
+                if report is not None:
+                    report['seconds'] = seconds
+                    report['bytes'] = size
+                    reports[dumpfile] = report
+    seconds = time.perf_counter () - start
+    print (f'{len (dumps) - failed} dumps, {total_bytes / 1e6:.1f} MB in {seconds:.1f} s, {total_bytes / 1e6 / max (seconds, 1e-6):.1f} MB/s')
+    if args.stats:  write_json (reports, stats_path (args))
+    if failed:  sys.exit (1)
+
+
+def main ():
+    parser = argparse.ArgumentParser (
+        description='Parse a support dump.'
+    )
+
+    dumps = parser.add_mutually_exclusive_group (required=True)
+    dumps.add_argument ('-file', dest='dumpfile', help='dump file to parse')
+    dumps.add_argument ('-batch', dest='batch', default=None, help='parse all the dumps in this directory, or matching this glob, each into its own directory under -out-dir')
+    dumps.add_argument ('-config-diff', dest='config_diff', nargs='+', metavar='TREE', default=None, help='compare the configuration files of two parsed output trees (old, new), or of all the hosts in one, and list what changed')
+    parser.add_argument ('-out-dir', dest='out_dir', default=None, help='output directory, default ./Support-Dump (with -batch, where the dumps\' directories go, default .)')
+    parser.add_argument ('-batch-jobs', dest='batch_jobs', type=int, default=os.cpu_count () or 1, help='dumps parsed at once with -batch, default the number of cpus')
+    parser.add_argument ('-memory-budget', dest='memory_budget', type=int, default=4096, help='MB all the dumps being parsed at once with -batch may take, going by a guess from their size, default 4096')
+    parser.add_argument ('-debug', dest='debug', default=False, help='debug output, True or False')
+    parser.add_argument ('-stream', dest='stream', action='store_true', help='write and free blocks as they are parsed, keeps memory bounded')
+    parser.add_argument ('-workers', dest='workers', type=int, default=1, help='threads writing output files, default 1')
+    parser.add_argument ('-pipeline', dest='pipeline', action='store_true', help='read the dump on a thread of its own and write on another, with bounded queues between them and the parsing, so they overlap (implies -stream)')
+    parser.add_argument ('-mmap', dest='mmap', action='store_true', help='memory map the dump, keep only line offsets and copy output straight from it')
+    parser.add_argument ('-jobs', dest='jobs', type=int, default=1, help='processes parsing host sections, default 1')
+    parser.add_argument ('-archive', dest='archive', default=None, help='write the output tree into this .zip, .tar, .tar.gz, .tar.bz2, .tar.xz or .tar.zst')
+    parser.add_argument ('-gzip', dest='gzip', action='store_true', help='gzip each output file')
+    parser.add_argument ('-index', dest='index', action='store_true', help='write an index of the output files next to the dump (dumpfile.index) instead of the files')
+    parser.add_argument ('-extract', dest='extract', action='append', default=None, help='write only the output files matching this glob (e.g. \'*/Logs/ErrorLog.txt\'), from the index; can be repeated')
+    parser.add_argument ('-sections', dest='sections', default=None, help='only these sections, comma separated globs like forest-status,configuration,log-files')
+    parser.add_argument ('-hosts', dest='hosts', default=None, help='only files for these hosts, comma separated globs')
+    parser.add_argument ('-groups', dest='groups', default=None, help='only files for these groups, comma separated globs')
+    parser.add_argument ('-forests', dest='forests', default=None, help='only files for these forests, comma separated globs')
+    parser.add_argument ('-databases', dest='databases', default=None, help='only files for these databases, comma separated globs')
+    parser.add_argument ('-paths', dest='paths', default=None, help='only output files matching these comma separated globs, relative to the output directory')
+    parser.add_argument ('-load', dest='load', default=None, help='load the files into MarkLogic at this REST url (like http://localhost:8000) instead of writing them')
+    parser.add_argument ('-load-user', dest='load_user', default=None, help='user for -load')
+    parser.add_argument ('-load-password', dest='load_password', default=None, help='password for -load')
+    parser.add_argument ('-load-auth', dest='load_auth', default='digest', choices=['digest', 'basic'], help='authentication for -load, default digest')
+    parser.add_argument ('-load-database', dest='load_database', default=None, help='database for -load, default the app server\'s')
+    parser.add_argument ('-load-collections', dest='load_collections', default='exp', help='comma separated collections for -load, default exp')
+    parser.add_argument ('-load-batch', dest='load_batch', type=int, default=100, help='documents per request for -load, default 100')
+    parser.add_argument ('-load-threads', dest='load_threads', type=int, default=4, help='requests at once for -load, default 4')
+    parser.add_argument ('-load-uri-prefix', dest='load_uri_prefix', default=None, help='URI prefix for -load instead of the absolute output path, like /dump-1/')
+    parser.add_argument ('-resume', dest='resume', action='store_true', help='keep a manifest in the output directory and skip what an earlier run already wrote')
+    parser.add_argument ('-store', dest='store', default=None, help='keep each file once in this content-addressed directory (shared by dumps) and hard link it into the output tree, with content-hashes.txt listing the hashes')
+    parser.add_argument ('-changed-since', dest='changed_since', default=None, help='with -store, list the files that differ from this other output directory, by its content-hashes.txt')
+    parser.add_argument ('-metrics', dest='metrics', default=None, help='write forest, transaction, host and app server tables to this sqlite file')
+    parser.add_argument ('-checks', dest='checks', action='store_true', help='run the stuck transactions and app server threads/queue checks on those tables')
+    parser.add_argument ('-log-index', dest='log_index', action='store_true', help=f'write a time index of the logs ({DumpLogIndex.name}) into the output directory')
+    parser.add_argument ('-log-index-lines', dest='log_index_lines', type=int, default=1000, help='most log lines between index entries, default 1000 (there is one a minute of log time too)')
+    parser.add_argument ('-timeline', dest='timeline', action='store_true', help='also merge all the hosts\' logs by time into Logs-Timeline.txt in the output directory')
+    parser.add_argument ('-log-from', dest='log_from', default=None, help='print the log entries of all hosts from this time on, like 2020-09-13T12:26, from the log time index (parsing the dump for it if it isn\'t there)')
+    parser.add_argument ('-log-to', dest='log_to', default=None, help='print the log entries of all hosts up to this time, to its precision, like 2020-09-13T12:30')
+    parser.add_argument ('-stats', '--stats', '--profile', dest='stats', nargs='?', const=True, default=None, help='write timings and counts as JSON to this file, - for stdout, default parse-stats.json in the output directory')
+
+    args = parser.parse_args()
+
+    if args.debug:  print (args)
+
+    if args.config_diff:
+        if len (args.config_diff) > 2:  parser.error ('-config-diff takes one output tree, or two to compare')
+        config_diff (args.config_diff)
+        return
+    args.out_dir_given = args.out_dir is not None
+    if args.batch:
+        if args.out_dir is None:  args.out_dir = '.'
+        batch_dumps (args)
+        return
+    if args.out_dir is None:  args.out_dir = './Support-Dump'
+    blocks = run (args)
+    if blocks is not None and blocks.stats is not None:  blocks.stats.write_report (stats_path (args))
+
+
+if __name__ == '__main__':
+    main ()